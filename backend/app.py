@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory, abort, jsonify, request, json
+from flask import Flask, Response, send_from_directory, abort, jsonify, request, json
 import os
 from db import *
 import json
@@ -9,9 +9,36 @@ import base64
 from google.oauth2 import id_token
 from google.auth.transport import requests
 import time
+import threading
 
 from openai import OpenAI
 from eatery import *
+from catalog import ExerciseCatalog, write_snapshot_file
+from autocomplete import ExerciseNameIndex, MAX_SUGGESTIONS
+from facets import FACET_FIELDS, FacetIndex
+from exercise_import import IMPORT_BATCH_SIZE, import_exercises, iter_records
+from muscles import MUSCLE_ROLES, exercises_for_muscle, sync_exercise_muscles
+from similarity import ExerciseSimilarity
+from dining_cache import EASTERN, FRESH_SECONDS, DiningMenuCache, DiningUnavailable, eastern_now, feed_hash
+from singleflight import run_once
+from recommendations import (COMMON_GOALS, cached_recommendation, get_recommendation, menus_hash,
+                             put_recommendation, recommendation_key)
+from streaming import FIRST_TOKEN_SECONDS, StreamTimeout, iter_completion_deltas, sse_event
+from meal_ranking import MealRanker, format_ranking
+from dining_store import eatery_menu, find_eatery, ingest_dining_data, where_served
+from dining_hours import OpenEateryIndex
+from jobs import (JOB_TIMEOUT_SECONDS, JOB_WORKERS, MAX_WAIT_SECONDS, JobQueue, QueueFull,
+                  serialize_job)
+from media import (DEFAULT_HOT_CACHE_BYTES, GifManifest, HotGifCache, IMMUTABLE_CACHE_CONTROL,
+                   REVALIDATE_CACHE_CONTROL, VARIANT_FORMATS, VariantManifest, negotiate_gif_format,
+                   stream_zip, versioned_gif_path)
+from gif_resize import ALLOWED_SIZES, DEFAULT_CACHE_BYTES, ResizedGifCache
+from storage import SIGNED_URL_REUSE_SECONDS, SIGNED_URL_SECONDS, S3MediaStorage, media_storage_from_env
+from flask import make_response, redirect
+import click
+from search import SEARCH_SOURCES, install_search_index, search
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
 import requests as http_requests
 from functools import wraps
 
@@ -21,6 +48,8 @@ app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///%s" % db_filename
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SQLALCHEMY_ECHO"] = True
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-key-for-testing")
+# Behind nginx/Apache, let the front end stream files instead of the worker
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
 
 # Set your actual Google Client ID - put your actual client ID here
 GOOGLE_CLIENT_ID = "567520598057-bv9qpqvcf095rso31u02ubi20j191lu7.apps.googleusercontent.com"
@@ -229,9 +258,211 @@ def google_login():
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    install_search_index(db)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 GIF_DIRECTORY = os.path.join(BASE_DIR, "exercise_gifs")
+# Prebuilt with `flask build-gif-manifest`; scanned at startup when missing
+GIF_MANIFEST_PATH = os.path.join(BASE_DIR, "gif_manifest.json")
+gif_manifest = GifManifest(GIF_DIRECTORY)
+if os.path.exists(GIF_MANIFEST_PATH):
+    gif_manifest.load(GIF_MANIFEST_PATH)
+else:
+    gif_manifest.scan()
+GIF_VARIANT_DIRECTORY = os.path.join(BASE_DIR, "gif_variants")
+gif_variants = VariantManifest(GIF_VARIANT_DIRECTORY)
+resized_gifs = ResizedGifCache(
+    os.path.join(BASE_DIR, "temp", "gif_cache"),
+    max_bytes=int(os.environ.get("GIF_CACHE_BYTES", DEFAULT_CACHE_BYTES))
+)
+hot_gifs = HotGifCache(max_bytes=int(os.environ.get("GIF_HOT_CACHE_BYTES", DEFAULT_HOT_CACHE_BYTES)))
+
+# MEDIA_STORAGE=local|s3; with MEDIA_REDIRECT=1 clients are sent to a signed URL instead
+media_storage = media_storage_from_env(GIF_DIRECTORY)
+MEDIA_REDIRECT = os.environ.get("MEDIA_REDIRECT") == "1"
+MEDIA_SOURCE_DIRECTORY = os.path.join(BASE_DIR, "temp", "media_sources")
+
+def local_gif_source(gif):
+    """Local path of a GIF, downloading it once when it lives in object storage"""
+    path = media_storage.local_path(gif.id, gif.hash)
+    if path is not None:
+        return path
+
+    path = os.path.join(MEDIA_SOURCE_DIRECTORY, f"{gif.id}.{gif.hash}.gif")
+    if not os.path.exists(path):
+        os.makedirs(MEDIA_SOURCE_DIRECTORY, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in media_storage.iter_chunks(gif.id, gif.hash):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    return path
+
+def load_exercise_rows():
+    rows = []
+    for exercise in Exercise.query.all():
+        row = exercise.serialize()
+        gif = gif_manifest.get(exercise.id)
+        # Size and dimensions let clients lay out and prefetch before the GIF arrives
+        row["gif"] = gif.serialize() if gif is not None else None
+        rows.append(row)
+    return rows
+
+def load_catalog_version():
+    return db.session.query(db.func.max(CatalogChange.id)).scalar() or 0
+
+exercise_catalog = ExerciseCatalog(load_exercise_rows, load_catalog_version)
+
+CATALOG_SNAPSHOT_DIRECTORY = os.path.join(BASE_DIR, "temp", "catalog")
+# Past this many changed exercises a client is better off with the full snapshot
+CATALOG_MAX_DELTA = 200
+
+exercise_name_index = ExerciseNameIndex()
+exercise_facets = FacetIndex()
+exercise_similarity = ExerciseSimilarity()
+
+# Catalog version the name, facet and similarity indexes reflect
+indexed_catalog_version = None
+exercise_index_lock = threading.Lock()
+
+def rebuild_exercise_indexes(snapshot):
+    """Rebuild the in-process indexes for a new snapshot, unless they already cover its version"""
+    global indexed_catalog_version
+    with exercise_index_lock:
+        if indexed_catalog_version == snapshot.version:
+            return
+        exercise_name_index.build([(exercise["id"], exercise["name"]) for exercise in snapshot.exercises])
+        exercise_facets.build(snapshot.exercises)
+        exercise_similarity.build(snapshot.exercises)
+        indexed_catalog_version = snapshot.version
+
+# Runs for every new snapshot, including ones caused by imports in other processes
+exercise_catalog.add_listener(rebuild_exercise_indexes)
+
+with app.app_context():
+    # One-off migration: backfill the muscle index from the JSON column
+    if ExerciseMuscle.query.first() is None and Exercise.query.first() is not None:
+        sync_exercise_muscles(db)
+        db.session.commit()
+    exercise_catalog.get_snapshot()
+    # One-off migration: normalize a feed persisted before the dining tables existed
+    if DiningEatery.query.first() is None and DiningFeed.query.first() is not None:
+        ingest_dining_data(db, json.loads(DiningFeed.query.first().payload))
+        db.session.commit()
+
+def load_dining_feed():
+    with app.app_context():
+        feed = DiningFeed.query.filter_by(source=DINING_API_URL).first()
+        if feed is None:
+            return None
+        return json.loads(feed.payload), feed.fetched_at
+
+def save_dining_feed(data, fetched_at):
+    content_hash = feed_hash(data)
+    with app.app_context():
+        feed = DiningFeed.query.filter_by(source=DINING_API_URL).first()
+        if feed is None:
+            feed = DiningFeed(source=DINING_API_URL)
+            db.session.add(feed)
+        changed = feed.content_hash != content_hash
+        report = None
+        try:
+            if changed:
+                feed.payload = json.dumps(data)
+                feed.content_hash = content_hash
+                feed.updated_at = datetime.utcnow()
+                # Same transaction as the hash, so a failed ingest is retried on the next fetch
+                report = ingest_dining_data(db, data)
+            feed.fetched_at = fetched_at
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if report is not None:
+            print(f"Ingested dining feed: {report}")
+
+# A copy another worker fetched this recently counts as this worker's refresh
+DINING_SHARE_SECONDS = 60
+
+def fetch_dining_feed():
+    """Fetch and persist the feed, letting only one worker process hit the upstream at a time"""
+    started = time.time()
+
+    def shared_copy():
+        row = load_dining_feed()
+        # Never share for longer than half the freshness window, or refreshes would be skipped
+        window = min(DINING_SHARE_SECONDS, dining_menus.fresh_seconds / 2)
+        if row is not None and row[1] >= started - window:
+            return row[0]
+        return None
+
+    def fetch_and_save():
+        data = fetch_dining_data()
+        save_dining_feed(data, time.time())
+        return data
+
+    with app.app_context():
+        data, _ = run_once(db, f"dining:{DINING_API_URL}", fetch_and_save, shared_copy)
+    return data
+
+# Refreshed in the background; requests only read the last good copy
+dining_menus = DiningMenuCache(
+    fetch_dining_feed,
+    load_persisted=load_dining_feed,
+    fresh_seconds=int(os.environ.get("DINING_FRESH_SECONDS", FRESH_SECONDS))
+)
+
+TOP_MEALS_COUNT = 10
+TOP_MEALS_FIRST_TOKEN_SECONDS = float(os.environ.get("TOP_MEALS_FIRST_TOKEN_SECONDS", FIRST_TOKEN_SECONDS))
+
+# Item features are precomputed once per menu change
+meal_ranker = MealRanker()
+dining_menus.add_listener(meal_ranker.ensure)
+# Operating-hours interval index, rebuilt with the menus
+open_eateries = OpenEateryIndex()
+dining_menus.add_listener(open_eateries.ensure)
+
+def top_meals_shortlist(snapshot, goal):
+    """Menus cut down to the locally best-ranked candidates for the goal, for the LLM prompt"""
+    return meal_ranker.ensure(snapshot).shortlist(goal)
+
+def top_meals_for(snapshot, goal, timeout=None):
+    """(recommendations, cached) for a goal, asking the LLM only on a cache miss"""
+    menus = top_meals_shortlist(snapshot, goal)
+    return cached_recommendation(
+        db, menus, goal, TOP_MEALS_COUNT, TOP_MEALS_MODEL,
+        lambda: ask_top_meals(menus, goal=goal, top_n=TOP_MEALS_COUNT, model=TOP_MEALS_MODEL, timeout=timeout),
+        timeout=timeout
+    )
+
+def pregenerate_recommendations(snapshot):
+    with app.app_context():
+        for goal in COMMON_GOALS:
+            try:
+                top_meals_for(snapshot, goal)
+            except Exception as e:
+                print(f"Error pregenerating {goal} recommendations: {str(e)}")
+
+if os.environ.get("PREGENERATE_RECOMMENDATIONS", "1") == "1":
+    # Runs off the refresh thread so a cold-start request never waits on the LLM for other goals
+    dining_menus.add_listener(
+        lambda snapshot: threading.Thread(target=pregenerate_recommendations, args=(snapshot,), daemon=True).start()
+    )
+
+# LLM work submitted as jobs runs here, off the request threads
+job_queue = JobQueue(
+    db, app.app_context,
+    workers=int(os.environ.get("JOB_WORKERS", JOB_WORKERS)),
+    timeout=float(os.environ.get("JOB_TIMEOUT_SECONDS", JOB_TIMEOUT_SECONDS))
+)
+
+def run_top_meals_job(payload, timeout):
+    recommendations, cached = top_meals_for(dining_menus.get(), payload.get("goal", "cutting"), timeout=timeout)
+    return {"recommendations": recommendations, "cached": cached}
+
+job_queue.register("top_meals", run_top_meals_job)
+# Workers resume jobs persisted before a restart as soon as the process is up
+job_queue.start()
 
 def generate_session_token():
     return str(uuid.uuid4())
@@ -439,6 +670,7 @@ def create_weekly_workout(user):
 @app.route("/api/exercises/", methods=["POST"])
 @user_authentication_required
 def create_exercise(user):
+    global indexed_catalog_version
     body = json.loads(request.data)
     new_exercise = Exercise(
         bodyPart=body.get("bodyPart"),
@@ -450,16 +682,251 @@ def create_exercise(user):
         instructions=body.get("instructions")
     )
     db.session.add(new_exercise)
+    db.session.flush()
+    sync_exercise_muscles(db, [new_exercise.id])
+    change = CatalogChange(exercise_id=new_exercise.id, op="insert")
+    db.session.add(change)
     db.session.commit()
+
+    with exercise_index_lock:
+        # Fold the insert in directly when nothing else changed since the last build
+        if indexed_catalog_version == change.id - 1:
+            exercise_name_index.add(new_exercise.id, new_exercise.name)
+            exercise_facets.add(new_exercise.serialize())
+            exercise_similarity.add(new_exercise.serialize())
+            indexed_catalog_version = change.id
+    exercise_catalog.invalidate()
     return success_response(new_exercise.serialize(), 201)
 
+EXERCISE_FILTERS = ("bodyPart", "equipment", "target")
+EXERCISE_QUERY_PARAMS = EXERCISE_FILTERS + ("name", "cursor", "limit", "fields")
+EXERCISE_PAGE_SIZE = 50
+EXERCISE_MAX_PAGE_SIZE = 200
+
+def encode_exercise_cursor(exercise):
+    raw = json.dumps([exercise.name, exercise.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_exercise_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, exercise_id = json.loads(raw)
+        if not isinstance(name, str) or not isinstance(exercise_id, int):
+            return None
+        return name, exercise_id
+    except (ValueError, TypeError):
+        return None
+
+@app.route("/api/exercises/bulk", methods=["POST"])
+@user_authentication_required
+def bulk_import_exercises(user):
+    try:
+        batch_size = max(1, int(request.args.get("batch_size", IMPORT_BATCH_SIZE)))
+    except ValueError:
+        return failure_response("batch_size must be an integer", 400)
+
+    try:
+        report = import_exercises(db, iter_records(request.stream), batch_size=batch_size)
+    except ValueError as e:
+        return failure_response(f"Invalid import payload: {str(e)}", 400)
+
+    if report["inserted"] or report["updated"]:
+        sync_exercise_muscles(db)
+        db.session.commit()
+        exercise_catalog.invalidate()
+    return success_response(report)
+
+@app.cli.command("import-exercises")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=IMPORT_BATCH_SIZE, show_default=True)
+def import_exercises_command(path, batch_size):
+    """Upsert exercises from an NDJSON file or a JSON array file"""
+    started = time.time()
+    with open(path, "rb") as f:
+        report = import_exercises(db, iter_records(f), batch_size=batch_size)
+    if report["inserted"] or report["updated"]:
+        sync_exercise_muscles(db)
+        db.session.commit()
+        # Running servers see the new catalog version within VERSION_CHECK_SECONDS and rebuild
+
+    click.echo(f"Inserted {report['inserted']}, updated {report['updated']}, "
+               f"skipped {report['skipped']} in {time.time() - started:.2f}s")
+    for error in report["errors"]:
+        click.echo(f"  record {error['index']}: {error['error']}")
+
 @app.route("/api/exercises/", methods=["GET"])
 def get_exercises():
-    exercises = Exercise.query.all()
-    if exercises is None or len(exercises) == 0:
+    # Unrelated params (cache-busters and the like) still get the snapshot
+    if any(key in request.args for key in EXERCISE_QUERY_PARAMS):
+        return query_exercises()
+
+    snapshot = exercise_catalog.get_snapshot()
+    if not snapshot.exercises:
         return failure_response("No exercises found!")
-    serialized_exercises = [exercise.serialize() for exercise in exercises]
-    return success_response(serialized_exercises)
+    return catalog_snapshot_response(snapshot)
+
+def query_exercises():
+    fields = EXERCISE_FIELDS
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args.get("fields").split(",") if f.strip()]
+        unknown = [f for f in fields if f not in EXERCISE_FIELDS]
+        if unknown:
+            return failure_response(f"Unknown fields: {', '.join(unknown)}", 400)
+
+    try:
+        limit = int(request.args.get("limit", EXERCISE_PAGE_SIZE))
+    except ValueError:
+        return failure_response("limit must be an integer", 400)
+    limit = max(1, min(limit, EXERCISE_MAX_PAGE_SIZE))
+
+    columns = set(fields) | {"id", "name"}
+    query = Exercise.query.options(load_only(*[getattr(Exercise, c) for c in columns]))
+
+    for key in EXERCISE_FILTERS:
+        if request.args.get(key):
+            query = query.filter(getattr(Exercise, key) == request.args.get(key))
+
+    prefix = request.args.get("name")
+    if prefix:
+        # Range scan instead of LIKE so SQLite can use the name index
+        query = query.filter(Exercise.name >= prefix, Exercise.name < prefix + "\uffff")
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        position = decode_exercise_cursor(cursor)
+        if position is None:
+            return failure_response("Invalid cursor", 400)
+        query = query.filter(tuple_(Exercise.name, Exercise.id) > position)
+
+    exercises = query.order_by(Exercise.name, Exercise.id).limit(limit + 1).all()
+    has_more = len(exercises) > limit
+    exercises = exercises[:limit]
+
+    return success_response({
+        "exercises": [exercise.serialize_fields(fields) for exercise in exercises],
+        "next_cursor": encode_exercise_cursor(exercises[-1]) if has_more else None
+    })
+
+def catalog_snapshot_response(snapshot):
+    gzip_etag = snapshot.etag + "-gzip"
+    use_gzip = request.accept_encodings["gzip"] > 0
+
+    if request.if_none_match.contains(snapshot.etag) or request.if_none_match.contains(gzip_etag):
+        response = Response(status=304)
+        response.set_etag(gzip_etag if use_gzip else snapshot.etag)
+    elif use_gzip:
+        response = Response(snapshot.gzip_body, mimetype="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(gzip_etag)
+    else:
+        response = Response(snapshot.body, mimetype="application/json")
+        response.set_etag(snapshot.etag)
+
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["X-Catalog-Version"] = str(snapshot.version)
+    return response
+
+@app.route("/api/exercises/autocomplete", methods=["GET"])
+def autocomplete_exercises():
+    q = request.args.get("q", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), MAX_SUGGESTIONS))
+    except ValueError:
+        return failure_response("limit must be an integer", 400)
+    # Rebuilds the indexes first if another process changed the catalog
+    exercise_catalog.get_snapshot()
+    return success_response(exercise_name_index.complete(q, limit))
+
+@app.route("/api/exercises/facets", methods=["GET"])
+def get_exercise_facets():
+    filters = {}
+    for field in FACET_FIELDS:
+        values = []
+        for value in request.args.getlist(field):
+            values.extend(v.strip() for v in value.split(",") if v.strip())
+        filters[field] = values
+    exercise_catalog.get_snapshot()
+    return success_response(exercise_facets.counts(filters))
+
+@app.route("/api/exercises/changes", methods=["GET"])
+def get_exercise_changes():
+    snapshot = exercise_catalog.get_snapshot()
+    since = request.args.get("since")
+    if since is None:
+        return catalog_snapshot_pointer(snapshot)
+    try:
+        since = int(since)
+    except ValueError:
+        return failure_response("since must be an integer", 400)
+    if since > snapshot.version:
+        # The client synced against a worker that already saw a newer version
+        exercise_catalog.invalidate()
+        snapshot = exercise_catalog.get_snapshot()
+    if since < 0 or since > snapshot.version:
+        return catalog_snapshot_pointer(snapshot)
+
+    changes = CatalogChange.query.with_entities(CatalogChange.exercise_id, CatalogChange.op).filter(
+        CatalogChange.id > since, CatalogChange.id <= snapshot.version
+    ).order_by(CatalogChange.id).all()
+
+    latest = {}
+    for exercise_id, op in changes:
+        latest[exercise_id] = op
+    if len(latest) > CATALOG_MAX_DELTA:
+        return catalog_snapshot_pointer(snapshot)
+
+    return success_response({
+        "version": snapshot.version,
+        "upserts": [snapshot.by_id[i] for i, op in latest.items() if op != "delete" and i in snapshot.by_id],
+        "deletes": [i for i, op in latest.items() if op == "delete" or i not in snapshot.by_id]
+    })
+
+def catalog_snapshot_pointer(snapshot):
+    write_snapshot_file(snapshot, CATALOG_SNAPSHOT_DIRECTORY)
+    return success_response({
+        "version": snapshot.version,
+        "snapshot_url": f"/api/exercises/snapshot/{snapshot.version}.json.gz"
+    })
+
+@app.route("/api/exercises/snapshot/<int:version>.json.gz", methods=["GET"])
+def get_exercise_snapshot_file(version):
+    filename = f"catalog-{version}.json.gz"
+    if not os.path.exists(os.path.join(CATALOG_SNAPSHOT_DIRECTORY, filename)):
+        snapshot = exercise_catalog.get_snapshot()
+        if version > snapshot.version:
+            exercise_catalog.invalidate()
+            snapshot = exercise_catalog.get_snapshot()
+        if snapshot.version != version:
+            return failure_response("Snapshot version not available")
+        # Pointer handed out by another worker that hasn't written this version yet
+        write_snapshot_file(snapshot, CATALOG_SNAPSHOT_DIRECTORY)
+    # Versioned files never change, so clients and proxies may keep them forever
+    response = send_from_directory(CATALOG_SNAPSHOT_DIRECTORY, filename,
+                                   mimetype="application/gzip", max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+@app.route("/api/exercises/batch", methods=["GET", "POST"])
+def get_exercises_batch():
+    if request.method == "POST":
+        body = json.loads(request.data) if request.data else {}
+        raw_ids = body.get("ids", []) if isinstance(body, dict) else []
+        if not isinstance(raw_ids, list):
+            return failure_response("ids must be a list", 400)
+    else:
+        raw_ids = [i for i in request.args.get("ids", "").split(",") if i.strip()]
+
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw_ids))
+    except (TypeError, ValueError):
+        return failure_response("ids must be integers", 400)
+
+    by_id = exercise_catalog.get_snapshot().by_id
+    return success_response({
+        "exercises": [by_id[i] for i in ids if i in by_id],
+        "missing": [i for i in ids if i not in by_id]
+    })
 
 @app.route("/api/exercises/<int:exercise_id>", methods=["GET"])
 def get_exercise_by_id(exercise_id):
@@ -468,14 +935,288 @@ def get_exercise_by_id(exercise_id):
         return failure_response("Exercise not found!")
     return success_response(exercise.serialize())
 
+@app.route("/api/muscles/<string:name>/exercises", methods=["GET"])
+def get_muscle_exercises(name):
+    role = request.args.get("role")
+    if role is not None and role not in MUSCLE_ROLES:
+        return failure_response(f"role must be one of: {', '.join(MUSCLE_ROLES)}", 400)
+
+    matches = exercises_for_muscle(db, name, role)
+    if matches is None:
+        return failure_response("Muscle not found!")
+
+    by_id = exercise_catalog.get_snapshot().by_id
+    return success_response({
+        "muscle": name,
+        "exercises": [dict(by_id[exercise_id], role=match_role)
+                      for exercise_id, match_role in matches if exercise_id in by_id]
+    })
+
+@app.cli.command("backfill-muscles")
+def backfill_muscles_command():
+    """Rebuild the exercise_muscle index from Exercise.secondaryMuscles"""
+    count = sync_exercise_muscles(db)
+    db.session.commit()
+    click.echo(f"Indexed {count} exercise/muscle pairs")
+
+@app.route("/api/exercises/<int:exercise_id>/alternatives", methods=["GET"])
+def get_exercise_alternatives(exercise_id):
+    equipment = [e.strip() for e in request.args.get("equipment", "").split(",") if e.strip()]
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        return failure_response("limit must be an integer", 400)
+
+    by_id = exercise_catalog.get_snapshot().by_id
+    alternatives = exercise_similarity.alternatives(exercise_id, equipment=equipment, limit=limit)
+    if alternatives is None:
+        return failure_response("Exercise not found!")
+
+    return success_response([dict(by_id[alt_id], similarity=round(score, 4))
+                             for alt_id, score in alternatives if alt_id in by_id])
+
 @app.route("/api/gifs/<int:gif_id>/", methods=["GET"])
 def get_gif(gif_id):
-    try:
-        filename = f"{gif_id}.gif"
-        return send_from_directory(GIF_DIRECTORY, filename)
-    except FileNotFoundError:
+    gif = gif_manifest.current(gif_id)
+    if gif is None:
         return failure_response(f"GIF with ID {gif_id} not found", 404)
 
+    response = send_gif(gif)
+    if response.status_code in (200, 206, 304):
+        # The plain URL may change content, so caches must revalidate; the hashed one never does
+        response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        response.headers["Link"] = f'<{versioned_gif_path(gif_id, gif.hash)}>; rel="canonical"'
+    return response
+
+@app.route("/api/gifs/<int:gif_id>/<string:content_hash>.gif", methods=["GET"])
+def get_versioned_gif(gif_id, content_hash):
+    gif = gif_manifest.current(gif_id)
+    if gif is None:
+        return failure_response(f"GIF with ID {gif_id} not found", 404)
+    if gif.hash != content_hash:
+        location = versioned_gif_path(gif_id, gif.hash)
+        if request.query_string:
+            location += "?" + request.query_string.decode("utf-8")
+        return redirect(location, 302)
+
+    response = send_gif(gif)
+    if response.status_code in (200, 206, 304):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def send_gif(gif):
+    requested = request.args.get("format")
+    if requested is not None and requested not in VARIANT_FORMATS:
+        return make_response(failure_response(f"format must be one of: {', '.join(VARIANT_FORMATS)}", 400))
+
+    width, height = request.args.get("w"), request.args.get("h")
+    if width or height:
+        try:
+            width, height = int(width) if width else None, int(height) if height else None
+        except ValueError:
+            return make_response(failure_response("w and h must be integers", 400))
+        # 0 used to mean "unset" and slipped past the whitelist as a full-size re-encode
+        if any(size is not None and size <= 0 for size in (width, height)):
+            return make_response(failure_response("w and h must be positive", 400))
+        if any(size is not None and size not in ALLOWED_SIZES for size in (width, height)):
+            return make_response(failure_response(f"w and h must be one of: {', '.join(map(str, ALLOWED_SIZES))}", 400))
+        if requested not in (None, "gif"):
+            return make_response(failure_response("Resizing is only available for format=gif", 400))
+
+        path = resized_gifs.get(local_gif_source(gif), gif.hash, gif.id, width, height)
+        response = send_media_file(resized_gifs.directory, os.path.basename(path), "image/gif",
+                                   f"{gif.hash}-{width or 0}x{height or 0}", gif.mtime)
+        response.headers["Vary"] = "Accept"
+        return response
+
+    fmt = negotiate_gif_format(requested, request.accept_mimetypes)
+    if fmt == "gif":
+        response = send_original_gif(gif)
+    else:
+        variant = gif_variants.variant(gif.id, gif.hash, fmt)
+        if variant is not None:
+            response = send_media_file(GIF_VARIANT_DIRECTORY, variant["path"], variant["mimetype"],
+                                       variant["hash"], gif.mtime)
+        elif requested:
+            return make_response(failure_response(f"No {fmt} variant for GIF {gif.id}", 404))
+        else:
+            # Negotiated WebP that hasn't been transcoded yet: the original is always fine
+            response = send_original_gif(gif)
+
+    response.headers["Vary"] = "Accept"
+    return response
+
+def send_original_gif(gif):
+    if MEDIA_REDIRECT:
+        url = media_storage.signed_url(gif.id, gif.hash)
+        if url is not None:
+            response = redirect(url, 302)
+            # A cached redirect must not outlive the signature it points at
+            response.headers["Cache-Control"] = f"private, max-age={SIGNED_URL_SECONDS - SIGNED_URL_REUSE_SECONDS}"
+            return response
+
+    key = (gif.id, gif.hash)
+    data = hot_gifs.get(key)
+    if data is None:
+        data = hot_gifs.offer(key, gif.size, lambda: media_storage.read(gif.id, gif.hash))
+    if data is None:
+        if media_storage.local_path(gif.id, gif.hash) is not None:
+            # Long tail: let send_file hand the file to wsgi.file_wrapper / X-Sendfile
+            return send_media_file(GIF_DIRECTORY, f"{gif.id}.gif", "image/gif", gif.hash, gif.mtime)
+        response = Response(media_storage.iter_chunks(gif.id, gif.hash), mimetype="image/gif")
+        response.set_etag(gif.hash)
+        response.last_modified = gif.mtime
+        response.content_length = gif.size
+        return response.make_conditional(request)
+
+    response = Response(data, mimetype="image/gif")
+    response.set_etag(gif.hash)
+    response.last_modified = gif.mtime
+    response.headers["Accept-Ranges"] = "bytes"
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+def send_media_file(directory, filename, mimetype, etag, last_modified):
+    # conditional=True gives us If-None-Match / If-Modified-Since 304s and Range requests
+    response = send_from_directory(
+        directory, filename,
+        mimetype=mimetype,
+        conditional=True,
+        etag=etag,
+        last_modified=last_modified
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+@app.route("/api/gifs/manifest", methods=["GET"])
+def get_gif_manifest_report():
+    return success_response(gif_manifest.report(exercise_catalog.get_snapshot().by_id.keys()))
+
+@app.cli.command("build-gif-manifest")
+def build_gif_manifest_command():
+    """Scan exercise_gifs/ and write gif_manifest.json for fast startup"""
+    gif_manifest.scan().save(GIF_MANIFEST_PATH)
+    report = gif_manifest.report(exercise_catalog.get_snapshot().by_id.keys())
+    click.echo(f"Indexed {report['gifs']} GIFs ({report['bytes']} bytes)")
+    click.echo(f"Exercises without a GIF: {report['exercises_missing_gif']}")
+    click.echo(f"GIFs without an exercise: {report['gifs_without_exercise']}")
+
+@app.cli.command("upload-media")
+def upload_media_command():
+    """Copy every GIF in the manifest to the configured object store"""
+    if not isinstance(media_storage, S3MediaStorage):
+        raise click.ClickException("Set MEDIA_STORAGE=s3 and MEDIA_BUCKET to upload media")
+
+    uploaded = 0
+    for gif in gif_manifest.gifs.values():
+        if media_storage.upload(os.path.join(GIF_DIRECTORY, f"{gif.id}.gif"), gif.id, gif.hash):
+            uploaded += 1
+    click.echo(f"Uploaded {uploaded} of {len(gif_manifest.gifs)} GIFs to {media_storage.bucket}")
+
+@app.route("/api/gifs/cache-stats", methods=["GET"])
+def get_gif_cache_stats():
+    return success_response(hot_gifs.stats())
+
+@app.route("/api/search", methods=["GET"])
+def search_all():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return failure_response("Missing search query", 400)
+
+    types = None
+    if request.args.get("type"):
+        types = [t.strip() for t in request.args.get("type").split(",") if t.strip()]
+        unknown = [t for t in types if t not in SEARCH_SOURCES]
+        if unknown:
+            return failure_response(f"Unknown search types: {', '.join(unknown)}", 400)
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        return failure_response("limit and offset must be integers", 400)
+
+    results = search(db, q, types=types, limit=limit + 1, offset=offset)
+    return success_response({
+        "results": results[:limit],
+        "next_offset": offset + limit if len(results) > limit else None
+    })
+
+@app.route("/api/dining/menus/", methods=["GET"])
+def get_dining_menus_route():
+    try:
+        snapshot = dining_menus.get()
+    except DiningUnavailable:
+        return failure_response("Dining menus are temporarily unavailable", 503)
+    return success_response({
+        "menus": snapshot.menus,
+        **dining_menus.status()
+    })
+
+@app.route("/api/dining/eateries/", methods=["GET"])
+def get_dining_eateries():
+    dining_menus.start()
+    eateries = DiningEatery.query.order_by(DiningEatery.name).all()
+    return success_response({"eateries": [e.serialize() for e in eateries]})
+
+@app.route("/api/dining/eateries/<string:key>/menu", methods=["GET"])
+def get_dining_eatery_menu(key):
+    """Menu for one eatery on ?date= (default today), optionally only ?meal=dinner"""
+    dining_menus.start()
+    # "Today" in Ithaca, not in the server's (UTC) timezone
+    date = request.args.get("date") or eastern_now().strftime("%Y-%m-%d")
+    eatery = find_eatery(db, key)
+    if eatery is None:
+        return failure_response("Eatery not found")
+    return success_response({
+        "eatery": {"id": eatery.id, "slug": eatery.slug, "name": eatery.name, "campus_area": eatery.campus_area},
+        "date": date,
+        "events": eatery_menu(db, eatery.id, date, request.args.get("meal"))
+    })
+
+@app.route("/api/dining/items/", methods=["GET"])
+def get_dining_item_locations():
+    """Where and when a dish is served: ?name=<item>[&date=YYYY-MM-DD]"""
+    dining_menus.start()
+    name = request.args.get("name", "").strip()
+    if not name:
+        return failure_response("name is required", 400)
+    rows = where_served(db, name, request.args.get("date"))
+    return success_response({
+        "item": name,
+        "served": [{"eatery": row.eatery, "slug": row.slug, "date": row.date, "meal": row.meal} for row in rows]
+    })
+
+@app.route("/api/dining/open", methods=["GET"])
+def get_open_eateries():
+    """Eateries serving at ?at= (unix seconds or ISO datetime, default now) and the meal being served.
+
+    A datetime without an offset is read as Ithaca time.
+    """
+    at = request.args.get("at")
+    try:
+        if at is None:
+            timestamp = int(time.time())
+        elif at.lstrip("-").isdigit():
+            timestamp = int(at)
+        else:
+            # fromisoformat only learns "Z" in Python 3.11
+            moment = datetime.fromisoformat(at[:-1] + "+00:00" if at.endswith(("Z", "z")) else at)
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=EASTERN)
+            timestamp = int(moment.timestamp())
+    except ValueError:
+        return failure_response("at must be a unix timestamp or ISO datetime", 400)
+
+    try:
+        index = open_eateries.ensure(dining_menus.get())
+    except DiningUnavailable:
+        return failure_response("Dining menus are temporarily unavailable", 503)
+    events = index.open_at(timestamp)
+    return success_response({
+        "at": timestamp,
+        "open": [dict(event, closes_in_seconds=event["end_timestamp"] - timestamp) for event in events],
+        "next_opening": index.next_opening(timestamp) if not events else None
+    })
 
 @app.route("/api/dining/top-meals/", methods=["POST"])
 @user_authentication_required  # Only allow authenticated users
@@ -483,19 +1224,124 @@ def get_top_meals(user):
     try:
         body = json.loads(request.data)
         goal = body.get("goal", "cutting")
-        menus = get_dining_menus()
+        mode = body.get("mode", "llm")
+        if mode not in ("fast", "llm"):
+            return failure_response("mode must be fast or llm", 400)
+        if body.get("async") and mode == "llm":
+            return submit_job("top_meals", {"goal": goal}, user)
+        snapshot = dining_menus.get()
         
-        # Get top meal recommendations
-        recommendations = ask_top_meals(menus, goal=goal, top_n=10)
+        if mode == "fast":
+            # Local ranking only, no LLM call
+            meals = meal_ranker.ensure(snapshot).rank(goal, top_n=TOP_MEALS_COUNT)
+            return success_response({
+                "recommendations": format_ranking(meals),
+                "meals": meals,
+                "mode": mode
+            })
+        
+        # Get top meal recommendations, usually pregenerated
+        recommendations, cached = top_meals_for(snapshot, goal)
         
         # Return recommendations
         return success_response({
-            "recommendations": recommendations
+            "recommendations": recommendations,
+            "cached": cached,
+            "mode": mode
         })
+    except DiningUnavailable as e:
+        print(f"Dining menus unavailable: {str(e)}")
+        return failure_response("Dining menus are temporarily unavailable", 503)
     except Exception as e:
         print(f"Error getting top meals: {str(e)}")
         return failure_response(f"Error getting top meals: {str(e)}", 500)
 
+@app.route("/api/dining/top-meals/stream", methods=["POST"])
+@user_authentication_required
+def stream_top_meals_route(user):
+    """Top meals as Server-Sent Events: delta events with text, then done or error"""
+    try:
+        body = json.loads(request.data or "{}")
+    except ValueError:
+        return failure_response("Request body must be valid JSON", 400)
+    if not isinstance(body, dict):
+        return failure_response("Request body must be a JSON object", 400)
+    goal = body.get("goal", "cutting")
+    try:
+        menus = top_meals_shortlist(dining_menus.get(), goal)
+    except DiningUnavailable:
+        return failure_response("Dining menus are temporarily unavailable", 503)
+
+    menu_hash = menus_hash(menus)
+    key = recommendation_key(menu_hash, goal, TOP_MEALS_COUNT, TOP_MEALS_MODEL)
+    cached = get_recommendation(db, key)
+
+    def events():
+        if cached is not None:
+            yield sse_event("delta", {"text": cached})
+            yield sse_event("done", {"cached": True})
+            return
+
+        parts = []
+        deltas = iter_completion_deltas(
+            lambda: stream_top_meals(menus, goal=goal, top_n=TOP_MEALS_COUNT, model=TOP_MEALS_MODEL),
+            first_token_seconds=TOP_MEALS_FIRST_TOKEN_SECONDS
+        )
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+        except StreamTimeout as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"Error streaming top meals: {str(e)}")
+            yield sse_event("error", {"error": "Error getting top meals"})
+            return
+        finally:
+            # Runs on client disconnect too, cancelling the upstream completion
+            deltas.close()
+
+        if parts:
+            with app.app_context():
+                put_recommendation(db, key, menu_hash, goal, TOP_MEALS_COUNT, TOP_MEALS_MODEL, "".join(parts))
+        yield sse_event("done", {"cached": False})
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx from buffering the stream
+        "X-Accel-Buffering": "no",
+    })
+
+def submit_job(kind, payload, user):
+    try:
+        job_id = job_queue.submit(kind, payload, user_id=user.id)
+    except QueueFull as e:
+        return failure_response(str(e), 503)
+    return success_response({"job_id": job_id, "status": "queued", "url": f"/api/jobs/{job_id}"}, 202)
+
+@app.route("/api/jobs/", methods=["POST"])
+@user_authentication_required
+def create_job(user):
+    body = json.loads(request.data or "{}")
+    kind = body.get("kind")
+    if kind not in job_queue.handlers:
+        return failure_response(f"kind must be one of {sorted(job_queue.handlers)}", 400)
+    return submit_job(kind, body.get("payload") or {}, user)
+
+@app.route("/api/jobs/<string:job_id>", methods=["GET"])
+@user_authentication_required
+def get_job(user, job_id):
+    """Job status and result; ?wait=<seconds> blocks until it finishes or the wait runs out"""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return failure_response("wait must be a number of seconds", 400)
+    job = job_queue.wait(job_id, max(0, min(wait, MAX_WAIT_SECONDS))) if wait > 0 else job_queue.get(job_id)
+    if job is None or job.user_id != user.id:
+        return failure_response("Job not found")
+    return success_response(serialize_job(job))
+
 # User Endpoints
 @app.route("/api/users/", methods=["GET"])
 @user_authentication_required
@@ -686,6 +1532,52 @@ def get_workout_by_id(workout_id):
         "exercise_plan": workout.get_exercise_plan()
     })
 
+@app.route("/api/workouts/<int:workout_id>/media", methods=["GET"])
+def get_workout_media(workout_id):
+    workout = Workout.query.filter_by(id=workout_id).first()
+    if workout is None:
+        return failure_response("Workout not found")
+
+    width = request.args.get("w")
+    if width is not None:
+        try:
+            width = int(width)
+        except ValueError:
+            return failure_response("w must be an integer", 400)
+        if width not in ALLOWED_SIZES:
+            return failure_response(f"w must be one of: {', '.join(map(str, ALLOWED_SIZES))}", 400)
+
+    found, missing = [], []
+    for exercise_id in dict.fromkeys(workout.get_exercises()):
+        gif = gif_manifest.current(exercise_id) if isinstance(exercise_id, int) else None
+        if gif is None:
+            missing.append(exercise_id)
+        else:
+            # Keep the entry itself, so the stream never looks it up again mid-zip
+            found.append(gif)
+
+    def entries():
+        yield "manifest.json", json.dumps({
+            "workout_id": workout_id,
+            "gifs": [{"exercise_id": gif.id, "file": f"{gif.id}.gif", "hash": gif.hash} for gif in found],
+            "missing": missing
+        }).encode("utf-8")
+        for gif in found:
+            source = local_gif_source(gif)
+            if width is not None:
+                source = resized_gifs.get(source, gif.hash, gif.id, width, None)
+            yield f"{gif.id}.gif", source
+
+    response = Response(stream_zip(entries()), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="workout-{workout_id}-media.zip"'
+    # Clients that would rather fetch in parallel can follow these instead of reading the bundle
+    suffix = f"?w={width}" if width is not None else ""
+    response.headers["Link"] = ", ".join(
+        f'<{versioned_gif_path(gif.id, gif.hash)}{suffix}>; rel=preload; as=image'
+        for gif in found
+    )
+    return response
+
 @app.route("/api/workouts/", methods=["POST"])
 @user_authentication_required
 def create_workout(user):
@@ -0,0 +1,134 @@
+import re
+import threading
+
+MAX_SUGGESTIONS = 20
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def normalize_name(name):
+    return " ".join(re.findall(r"[a-z0-9]+", (name or "").lower()))
+
+
+def trigrams(text):
+    padded = "  %s " % text
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+
+class ExerciseNameIndex:
+    """Prefix trie plus trigram postings over exercise names.
+
+    Every trie node keeps its best MAX_SUGGESTIONS completions, so a
+    prefix lookup is a walk of len(prefix) nodes with no scan at the end.
+    Matches on the start of the name rank ahead of matches on a later word.
+    """
+
+    def __init__(self):
+        # (root, word_root, names, rank, grams, postings), replaced as one by build()
+        # so lock-free readers never mix two builds
+        self.state = (TrieNode(), TrieNode(), {}, {}, {}, {})
+        self.lock = threading.Lock()
+
+    def build(self, rows):
+        # Held so a concurrent add() can't land in the state being replaced; readers don't take it
+        with self.lock:
+            state = (TrieNode(), TrieNode(), {}, {}, {}, {})
+            postings = {}
+            for exercise_id, name in rows:
+                for gram in self._insert(state, exercise_id, name):
+                    postings.setdefault(gram, set()).add(exercise_id)
+            state[5].update((gram, frozenset(ids)) for gram, ids in postings.items())
+            self.state = state
+
+    def add(self, exercise_id, name):
+        with self.lock:
+            postings = self.state[5]
+            for gram in self._insert(self.state, exercise_id, name):
+                # New sets, swapped in, so fuzzy() can iterate postings without the lock
+                postings[gram] = postings.get(gram, frozenset()) | {exercise_id}
+
+    def _insert(self, state, exercise_id, name):
+        """Index a name in the tries; returns its trigrams for the caller to post.
+
+        names, rank and grams are filled before the id becomes reachable
+        from a trie node, so readers that find it can always resolve it.
+        """
+        root, word_root, names, rank, grams_by_id, _ = state
+        normalized = normalize_name(name)
+        if not normalized or exercise_id in names:
+            return ()
+
+        names[exercise_id] = name
+        rank[exercise_id] = (len(normalized), normalized, exercise_id)
+        grams = trigrams(normalized)
+        grams_by_id[exercise_id] = len(grams)
+
+        # Index from every word start so "press" completes "bench press"
+        words = normalized.split(" ")
+        for i in range(len(words)):
+            node = root if i == 0 else word_root
+            for char in " ".join(words[i:]):
+                node = node.children.setdefault(char, TrieNode())
+                self._offer(node, exercise_id, rank)
+        return grams
+
+    def _offer(self, node, exercise_id, rank):
+        top = node.top
+        if exercise_id in top:
+            return
+        if len(top) < MAX_SUGGESTIONS or rank[exercise_id] < rank[top[-1]]:
+            # Swap in a new list so lock-free readers never see a partial update
+            node.top = sorted(top + [exercise_id], key=rank.__getitem__)[:MAX_SUGGESTIONS]
+
+    def complete(self, query, limit=10):
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+
+        state = self.state
+        root, word_root, names = state[:3]
+        ids = []
+        for node in (root, word_root):
+            self._collect(ids, self._walk(node, normalized), limit)
+        if len(ids) < limit:
+            self._collect(ids, self.fuzzy(normalized, limit, state), limit)
+
+        return [{"id": exercise_id, "name": names[exercise_id]} for exercise_id in ids]
+
+    def _walk(self, node, normalized):
+        for char in normalized:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top
+
+    def _collect(self, ids, candidates, limit):
+        for exercise_id in candidates:
+            if len(ids) >= limit:
+                return
+            if exercise_id not in ids:
+                ids.append(exercise_id)
+
+    def fuzzy(self, normalized, limit, state=None):
+        _, _, _, rank, grams, postings = state or self.state
+        query_grams = trigrams(normalized)
+        counts = {}
+        for gram in query_grams:
+            for exercise_id in postings.get(gram, ()):
+                counts[exercise_id] = counts.get(exercise_id, 0) + 1
+
+        scored = []
+        for exercise_id, common in counts.items():
+            # Dice coefficient over trigram sets
+            score = 2.0 * common / (len(query_grams) + grams[exercise_id])
+            if score >= MIN_TRIGRAM_SIMILARITY:
+                scored.append((-score, rank[exercise_id], exercise_id))
+        scored.sort()
+        return [exercise_id for _, _, exercise_id in scored[:limit]]
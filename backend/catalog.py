@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# How often a process asks the database whether another process changed the catalog
+VERSION_CHECK_SECONDS = 5
+# Older snapshot files stay around so pointers handed out just before a change still resolve
+SNAPSHOT_FILES_KEPT = 5
+
+
+class CatalogSnapshot:
+    def __init__(self, version, exercises):
+        self.version = version
+        self.exercises = exercises
+        self.by_id = {exercise["id"]: exercise for exercise in exercises}
+        self.body = json.dumps(exercises).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = "%s-%s" % (version, hashlib.sha1(self.body).hexdigest()[:16])
+
+
+class ExerciseCatalog:
+    """Serialized exercise catalog, rebuilt lazily after each invalidation.
+
+    The version comes from the persistent change log, so it survives
+    restarts. It is re-read at most every check_seconds, and a version
+    moved by another process (a CLI import, another worker) rebuilds the
+    snapshot and notifies listeners.
+    """
+
+    def __init__(self, loader, version_loader, check_seconds=VERSION_CHECK_SECONDS):
+        self.loader = loader
+        self.version_loader = version_loader
+        self.check_seconds = check_seconds
+        self.snapshot = None
+        self.checked_at = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) whenever a new snapshot is built"""
+        self.listeners.append(listener)
+
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() - self.checked_at < self.check_seconds:
+            return snapshot
+
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is not None and time.monotonic() - self.checked_at < self.check_seconds:
+                return snapshot
+            version = self.version_loader()
+            self.checked_at = time.monotonic()
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            snapshot = self.snapshot = CatalogSnapshot(version, self.loader())
+
+        for listener in self.listeners:
+            listener(snapshot)
+        return snapshot
+
+    def invalidate(self):
+        """Re-read the persisted version on the next get_snapshot(); rebuilds only if it moved"""
+        with self.lock:
+            self.checked_at = 0
+
+
+def write_snapshot_file(snapshot, directory, keep=SNAPSHOT_FILES_KEPT):
+    """Write the gzip body to catalog-<version>.json.gz once and prune all but the newest keep versions"""
+    filename = "catalog-%d.json.gz" % snapshot.version
+    path = os.path.join(directory, filename)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(snapshot.gzip_body)
+    os.replace(tmp_path, path)
+
+    versions = []
+    for name in os.listdir(directory):
+        version = name[len("catalog-"):-len(".json.gz")]
+        if name.startswith("catalog-") and name.endswith(".json.gz") and version.isdigit():
+            versions.append(int(version))
+    for version in sorted(versions, reverse=True)[keep:]:
+        try:
+            os.remove(os.path.join(directory, "catalog-%d.json.gz" % version))
+        except OSError:
+            pass
+    return path
@@ -175,6 +175,8 @@ class Workout(db.Model):
         return f'<Workout {self.name}>'
 
 
+EXERCISE_FIELDS = ("id", "bodyPart", "equipment", "gifUrl", "name", "target", "secondaryMuscles", "instructions")
+
 class Exercise(db.Model):    
     __tablename__ = "exercise"    
     
@@ -228,6 +230,17 @@ class Exercise(db.Model):
             "instructions": self.get_instructions(),
         }
     
+    def serialize_fields(self, fields):
+        data = {}
+        for field in fields:
+            if field == "secondaryMuscles":
+                data[field] = self.get_secondary_muscles()
+            elif field == "instructions":
+                data[field] = self.get_instructions()
+            else:
+                data[field] = getattr(self, field)
+        return data
+    
     def to_dict(self):
         return self.serialize()
         
@@ -238,6 +251,204 @@ class Exercise(db.Model):
         return f'<Exercise {self.name}>'
 
 
+class CatalogChange(db.Model):
+    __tablename__ = "catalog_change"
+    
+    # The id doubles as the catalog version after this change
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    exercise_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # "insert", "update" or "delete"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    def __repr__(self):
+        return f'<CatalogChange {self.id} {self.op} {self.exercise_id}>'
+
+
+class DiningFeed(db.Model):
+    __tablename__ = "dining_feed"
+    
+    # Last good copy of each upstream dining feed, so restarts serve menus without a fetch
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String, nullable=False, unique=True)
+    content_hash = db.Column(db.String(40), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DiningFeed {self.source} {self.content_hash}>'
+
+
+class MealRecommendation(db.Model):
+    __tablename__ = "meal_recommendation"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # sha1 of (menus hash, goal, top_n, model)
+    cache_key = db.Column(db.String(40), nullable=False, unique=True)
+    menus_hash = db.Column(db.String(40), nullable=False)
+    goal = db.Column(db.String, nullable=False)
+    top_n = db.Column(db.Integer, nullable=False)
+    model = db.Column(db.String, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    last_used_at = db.Column(db.Float, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<MealRecommendation {self.goal} {self.menus_hash[:8]}>'
+
+
+class FlightLock(db.Model):
+    __tablename__ = "flight_lock"
+    
+    # Held by the one worker process computing a shared result (menu fetch, LLM call)
+    key = db.Column(db.String, primary_key=True)
+    owner = db.Column(db.String, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<FlightLock {self.key} {self.owner}>'
+
+
+class Muscle(db.Model):
+    __tablename__ = "muscle"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<Muscle {self.name}>'
+
+
+class ExerciseMuscle(db.Model):
+    __tablename__ = "exercise_muscle"
+    
+    exercise_id = db.Column(db.Integer, db.ForeignKey("exercise.id", ondelete="CASCADE"), primary_key=True)
+    muscle_id = db.Column(db.Integer, db.ForeignKey("muscle.id", ondelete="CASCADE"), primary_key=True)
+    role = db.Column(db.String(10), primary_key=True)  # "primary" (target) or "secondary"
+    
+    # The primary key serves exercise -> muscles; this one serves muscle -> exercises
+    __table_args__ = (
+        db.Index("ix_exercise_muscle_muscle_role", "muscle_id", "role", "exercise_id"),
+    )
+    
+    def __repr__(self):
+        return f'<ExerciseMuscle {self.exercise_id} {self.muscle_id} {self.role}>'
+
+
+class DiningEatery(db.Model):
+    __tablename__ = "dining_eatery"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String, nullable=False, unique=True)
+    source_id = db.Column(db.Integer, nullable=True)
+    name = db.Column(db.String, nullable=False)
+    campus_area = db.Column(db.String, nullable=True)
+    # Hash of the eatery's part of the feed; unchanged eateries are skipped on refresh
+    content_hash = db.Column(db.String(40), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def serialize(self):
+        return {
+            "id": self.id,
+            "slug": self.slug,
+            "name": self.name,
+            "campus_area": self.campus_area,
+        }
+    
+    def __repr__(self):
+        return f'<DiningEatery {self.slug}>'
+
+
+class DiningDay(db.Model):
+    __tablename__ = "dining_day"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    eatery_id = db.Column(db.Integer, db.ForeignKey("dining_eatery.id", ondelete="CASCADE"), nullable=False)
+    date = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD
+    status = db.Column(db.String, nullable=True)
+    
+    __table_args__ = (
+        db.Index("ix_dining_day_eatery_date", "eatery_id", "date", unique=True),
+    )
+
+
+class DiningEvent(db.Model):
+    __tablename__ = "dining_event"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day_id = db.Column(db.Integer, db.ForeignKey("dining_day.id", ondelete="CASCADE"), nullable=False, index=True)
+    eatery_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.String(10), nullable=False)
+    descr = db.Column(db.String, nullable=True)  # "Breakfast", "Lunch", ...
+    meal = db.Column(db.String, nullable=True)  # descr lowercased, for lookups
+    start_ts = db.Column(db.Integer, nullable=True)
+    end_ts = db.Column(db.Integer, nullable=True)
+    start = db.Column(db.String, nullable=True)
+    end = db.Column(db.String, nullable=True)
+    
+    __table_args__ = (
+        db.Index("ix_dining_event_eatery_date_meal", "eatery_id", "date", "meal"),
+    )
+
+
+class DiningCategory(db.Model):
+    __tablename__ = "dining_category"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey("dining_event.id", ondelete="CASCADE"), nullable=False, index=True)
+    eatery_id = db.Column(db.Integer, nullable=False, index=True)
+    name = db.Column(db.String, nullable=True)
+    sort_idx = db.Column(db.Integer, nullable=True)
+
+
+class DiningItem(db.Model):
+    __tablename__ = "dining_item"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey("dining_category.id", ondelete="CASCADE"), nullable=False, index=True)
+    event_id = db.Column(db.Integer, nullable=False)
+    eatery_id = db.Column(db.Integer, nullable=False, index=True)
+    date = db.Column(db.String(10), nullable=False)
+    name = db.Column(db.String, nullable=False)
+    name_key = db.Column(db.String, nullable=False)  # lowercased name, for "where is X served"
+    healthy = db.Column(db.Boolean, default=False)
+    sort_idx = db.Column(db.Integer, nullable=True)
+    
+    __table_args__ = (
+        db.Index("ix_dining_item_name_date", "name_key", "date"),
+    )
+
+
+class Job(db.Model):
+    __tablename__ = "job"
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False)  # "queued", "running", "succeeded" or "failed"
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    owner = db.Column(db.String, nullable=True)  # worker holding a running job
+    lease_until = db.Column(db.Float, nullable=True)
+    run_after = db.Column(db.Float, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.Float, nullable=True)
+    finished_at = db.Column(db.Float, nullable=True)
+    
+    __table_args__ = (
+        db.Index("ix_job_status_run_after", "status", "run_after"),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
 class WeeklyWorkout(db.Model):
     __tablename__ = "weekly_workout"
     
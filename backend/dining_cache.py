@@ -0,0 +1,242 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta, tzinfo
+
+from eatery import parse_dining_menus
+
+# Menus are refreshed at least this often, and shortly after each Ithaca meal period starts
+FRESH_SECONDS = 30 * 60
+MEAL_REFRESH_TIMES = ((0, 5), (6, 45), (10, 45), (16, 15))
+# Back off between failed refreshes, up to FRESH_SECONDS
+RETRY_SECONDS = 30
+
+
+class DiningUnavailable(Exception):
+    pass
+
+
+def feed_hash(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class DiningSnapshot:
+    def __init__(self, data, fetched_at):
+        self.data = data
+        self.fetched_at = fetched_at
+        self.menus = parse_dining_menus(data)
+        self.content_hash = feed_hash(data)
+
+
+def first_sunday(year, month, day):
+    start = date(year, month, day)
+    return start + timedelta(days=(6 - start.weekday()) % 7)
+
+
+class USEastern(tzinfo):
+    """America/New_York under the US daylight saving rules in force since 2007.
+
+    The image runs Python 3.7, which has no zoneinfo; servers there run in
+    UTC while the dining halls keep Ithaca time.
+    """
+
+    def utcoffset(self, dt):
+        return timedelta(hours=-5) + self.dst(dt)
+
+    def dst(self, dt):
+        if dt is None:
+            return timedelta(0)
+        start, end = self.transitions(dt.year)
+        local = dt.replace(tzinfo=None)
+        # The repeated hour before the November switch is daylight time on its first pass (fold=0)
+        if start <= local < end and not (dt.fold and local >= end - timedelta(hours=1)):
+            return timedelta(hours=1)
+        return timedelta(0)
+
+    def fromutc(self, dt):
+        start, end = self.transitions(dt.year)
+        utc = dt.replace(tzinfo=None)
+        if start + timedelta(hours=5) <= utc < end + timedelta(hours=4):
+            return (utc - timedelta(hours=4)).replace(tzinfo=self)
+        local = (utc - timedelta(hours=5)).replace(tzinfo=self)
+        if end - timedelta(hours=1) <= local.replace(tzinfo=None) < end:
+            local = local.replace(fold=1)
+        return local
+
+    @staticmethod
+    def transitions(year):
+        """Local wall times daylight time starts and ends: 2:00 on the second Sunday of March
+        and 2:00 on the first Sunday of November"""
+        start = datetime.combine(first_sunday(year, 3, 8), datetime.min.time()) + timedelta(hours=2)
+        end = datetime.combine(first_sunday(year, 11, 1), datetime.min.time()) + timedelta(hours=2)
+        return start, end
+
+    def tzname(self, dt):
+        return "EDT" if self.dst(dt) else "EST"
+
+
+EASTERN = USEastern()
+
+
+def eastern_now():
+    return datetime.now(EASTERN)
+
+
+def next_refresh_delay(now=None, fresh_seconds=FRESH_SECONDS):
+    """Seconds until the next scheduled refresh: the next meal boundary or fresh_seconds, whichever is first"""
+    now = now or eastern_now()
+    delay = fresh_seconds
+    for hour, minute in MEAL_REFRESH_TIMES:
+        boundary = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if boundary <= now:
+            boundary += timedelta(days=1)
+        # Through timestamps, so a daylight saving switch in between is accounted for
+        delay = min(delay, boundary.timestamp() - now.timestamp())
+    return max(1, delay)
+
+
+class DiningMenuCache:
+    """Last good copy of the dining feed, refreshed in the background.
+
+    Readers never wait on the upstream once a copy exists: a stale copy is
+    served while a single refresh runs, and a failed refresh keeps the old
+    one. The payload is persisted so a restart starts warm.
+    """
+
+    def __init__(self, fetch, load_persisted=None, persist=None, fresh_seconds=FRESH_SECONDS):
+        self.fetch = fetch
+        self.load_persisted = load_persisted
+        self.persist = persist
+        self.fresh_seconds = fresh_seconds
+        self.snapshot = None
+        self.loaded = False
+        self.last_error = None
+        self.last_attempt = 0
+        self.failures = 0
+        self.refresh_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.listeners = []
+
+    def get(self):
+        """Current snapshot; blocks on the upstream only when nothing has ever been fetched"""
+        self.start()
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self._load()
+        if snapshot is None:
+            with self.refresh_lock:
+                if self.snapshot is None:
+                    self._refresh()
+            snapshot = self.snapshot
+            if snapshot is None:
+                raise DiningUnavailable(self.last_error or "Dining menus are unavailable")
+        elif self.is_stale(snapshot):
+            self.refresh_async()
+        return snapshot
+
+    def is_stale(self, snapshot):
+        return time.time() - snapshot.fetched_at > self.fresh_seconds
+
+    def _load(self):
+        with self.lock:
+            if self.loaded or self.load_persisted is None:
+                return self.snapshot
+            self.loaded = True
+            try:
+                row = self.load_persisted()
+            except Exception as e:
+                print(f"Error loading persisted dining menus: {e}")
+                row = None
+            if row is not None and self.snapshot is None:
+                data, fetched_at = row
+                self.snapshot = DiningSnapshot(data, fetched_at)
+            return self.snapshot
+
+    def refresh(self):
+        """Fetch now unless another refresh is already running; returns True when the copy was updated"""
+        if not self.refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._refresh()
+        finally:
+            self.refresh_lock.release()
+
+    def refresh_async(self):
+        # Skip while a failed refresh is backing off, so a dead upstream is not hammered
+        if time.time() - self.last_attempt < self._retry_delay():
+            return
+        if self.refresh_lock.locked():
+            return
+        threading.Thread(target=self.refresh, name="dining-refresh", daemon=True).start()
+
+    def _retry_delay(self):
+        if not self.failures:
+            return 0
+        return min(self.fresh_seconds, RETRY_SECONDS * 2 ** (self.failures - 1))
+
+    def _refresh(self):
+        self.last_attempt = time.time()
+        try:
+            snapshot = DiningSnapshot(self.fetch(), time.time())
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"Error refreshing dining menus: {e}")
+            return False
+
+        previous = self.snapshot
+        changed = previous is None or previous.content_hash != snapshot.content_hash
+        self.snapshot = snapshot
+        self.failures = 0
+        self.last_error = None
+        if self.persist is not None:
+            try:
+                self.persist(snapshot, changed)
+            except Exception as e:
+                print(f"Error persisting dining menus: {e}")
+        if changed:
+            for listener in self.listeners:
+                try:
+                    listener(snapshot)
+                except Exception as e:
+                    print(f"Error in dining menu listener: {e}")
+        return True
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) from the refreshing thread whenever the menus change"""
+        self.listeners.append(listener)
+
+    def start(self):
+        """Start the background refresher once per process"""
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="dining-scheduler", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        snapshot = self.snapshot or self._load()
+        if snapshot is None or self.is_stale(snapshot):
+            self.refresh()
+        while True:
+            if self.failures:
+                delay = self._retry_delay()
+            else:
+                age = time.time() - self.snapshot.fetched_at if self.snapshot else self.fresh_seconds
+                delay = next_refresh_delay(fresh_seconds=self.fresh_seconds - age)
+            time.sleep(delay)
+            self.refresh()
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            "fetched_at": snapshot.fetched_at if snapshot else None,
+            "content_hash": snapshot.content_hash if snapshot else None,
+            "stale": snapshot is None or self.is_stale(snapshot),
+            "last_error": self.last_error,
+            "failures": self.failures,
+        }
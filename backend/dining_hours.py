@@ -0,0 +1,81 @@
+import bisect
+import threading
+
+from dining_store import eatery_slug
+
+
+class OpenEateryIndex:
+    """Which eateries are serving at a given time, from the feed's event start/end timestamps.
+
+    Every event boundary is a breakpoint; the events active in each
+    elementary segment between breakpoints are precomputed with one sweep,
+    so a lookup is a single bisect.
+    """
+
+    def __init__(self):
+        self.content_hash = None
+        # (events, starts, points, active), swapped as one so readers never mix two builds
+        self.state = ([], [], [], [])
+        self.lock = threading.Lock()
+
+    def ensure(self, snapshot):
+        """Rebuild for a new dining snapshot; a no-op while the feed is unchanged"""
+        if self.content_hash == snapshot.content_hash:
+            return self
+        with self.lock:
+            if self.content_hash != snapshot.content_hash:
+                self.build(snapshot.data, snapshot.content_hash)
+        return self
+
+    def build(self, data, content_hash=None):
+        events = []
+        for eatery in data.get("data", {}).get("eateries", []):
+            for day in eatery.get("operatingHours", []):
+                for event in day.get("events", []):
+                    start, end = event.get("startTimestamp"), event.get("endTimestamp")
+                    if not isinstance(start, (int, float)) or not isinstance(end, (int, float)) or end <= start:
+                        continue
+                    events.append({
+                        "eatery": eatery.get("name"),
+                        "slug": eatery_slug(eatery),
+                        "meal": event.get("descr"),
+                        "start": event.get("start"),
+                        "end": event.get("end"),
+                        "start_timestamp": int(start),
+                        "end_timestamp": int(end),
+                    })
+        events.sort(key=lambda e: (e["start_timestamp"], e["end_timestamp"], e["eatery"] or ""))
+
+        # Sweep the boundaries in time order; ends sort before starts at the same instant
+        boundaries = sorted(
+            [(e["start_timestamp"], 1, i) for i, e in enumerate(events)] +
+            [(e["end_timestamp"], 0, i) for i, e in enumerate(events)]
+        )
+        points, active, current = [], [], set()
+        for position, (timestamp, is_start, i) in enumerate(boundaries):
+            if is_start:
+                current.add(i)
+            else:
+                current.discard(i)
+            if position + 1 < len(boundaries) and boundaries[position + 1][0] == timestamp:
+                continue
+            points.append(timestamp)
+            active.append(tuple(sorted(current)))
+
+        self.state = (events, [e["start_timestamp"] for e in events], points, active)
+        self.content_hash = content_hash
+        return self
+
+    def open_at(self, timestamp):
+        """Events in progress at timestamp: start <= timestamp < end"""
+        events, _, points, active = self.state
+        segment = bisect.bisect_right(points, timestamp) - 1
+        if segment < 0:
+            return []
+        return [events[i] for i in active[segment]]
+
+    def next_opening(self, timestamp):
+        """Earliest event starting after timestamp, or None"""
+        events, starts, _, _ = self.state
+        i = bisect.bisect_right(starts, timestamp)
+        return events[i] if i < len(starts) else None
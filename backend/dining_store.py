@@ -0,0 +1,190 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+from sqlalchemy import bindparam, text
+
+
+def eatery_slug(eatery):
+    slug = eatery.get("slug") or eatery.get("name") or ""
+    return re.sub(r"[^a-z0-9]+", "-", slug.lower()).strip("-")
+
+
+def normalize_meal(descr):
+    return " ".join((descr or "").lower().split())
+
+
+def eatery_hash(eatery):
+    return hashlib.sha1(json.dumps(eatery, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def ingest_dining_data(db, data):
+    """Write the feed into the dining_* tables, rewriting only eateries whose content changed.
+
+    Returns {"eateries", "changed", "skipped", "removed"}. Does not commit,
+    so callers can record the feed in the same transaction.
+    """
+    report = {"eateries": 0, "changed": 0, "skipped": 0, "removed": 0}
+    existing = {
+        row.slug: (row.id, row.content_hash)
+        for row in db.session.execute(text("SELECT id, slug, content_hash FROM dining_eatery")).all()
+    }
+    seen = set()
+    for eatery in data.get("data", {}).get("eateries", []):
+        slug = eatery_slug(eatery)
+        if not slug or slug in seen:
+            continue
+        seen.add(slug)
+        report["eateries"] += 1
+
+        content_hash = eatery_hash(eatery)
+        current = existing.get(slug)
+        if current is not None and current[1] == content_hash:
+            report["skipped"] += 1
+            continue
+        report["changed"] += 1
+
+        fields = {
+            "slug": slug,
+            "source_id": eatery.get("id"),
+            "name": eatery.get("name") or slug,
+            "campus_area": (eatery.get("campusArea") or {}).get("descrshort"),
+            "content_hash": content_hash,
+            "updated_at": datetime.utcnow(),
+        }
+        if current is None:
+            eatery_id = db.session.execute(text(
+                "INSERT INTO dining_eatery (slug, source_id, name, campus_area, content_hash, updated_at) "
+                "VALUES (:slug, :source_id, :name, :campus_area, :content_hash, :updated_at)"
+            ), fields).lastrowid
+        else:
+            eatery_id = current[0]
+            delete_eatery_menus(db, eatery_id)
+            db.session.execute(text(
+                "UPDATE dining_eatery SET source_id = :source_id, name = :name, campus_area = :campus_area, "
+                "content_hash = :content_hash, updated_at = :updated_at WHERE id = :id"
+            ), dict(fields, id=eatery_id))
+        insert_eatery_menus(db, eatery_id, eatery)
+
+    for slug in set(existing) - seen:
+        delete_eatery_menus(db, existing[slug][0])
+        db.session.execute(text("DELETE FROM dining_eatery WHERE id = :id"), {"id": existing[slug][0]})
+        report["removed"] += 1
+    return report
+
+
+def delete_eatery_menus(db, eatery_id):
+    params = {"eatery_id": eatery_id}
+    db.session.execute(text("DELETE FROM dining_item WHERE eatery_id = :eatery_id"), params)
+    db.session.execute(text("DELETE FROM dining_category WHERE eatery_id = :eatery_id"), params)
+    db.session.execute(text("DELETE FROM dining_event WHERE eatery_id = :eatery_id"), params)
+    db.session.execute(text("DELETE FROM dining_day WHERE eatery_id = :eatery_id"), params)
+
+
+def insert_eatery_menus(db, eatery_id, eatery):
+    items = []
+    dates = set()
+    for day in eatery.get("operatingHours", []):
+        date = day.get("date")
+        if not date or date in dates:
+            continue
+        dates.add(date)
+        day_id = db.session.execute(text(
+            "INSERT INTO dining_day (eatery_id, date, status) VALUES (:eatery_id, :date, :status)"
+        ), {"eatery_id": eatery_id, "date": date, "status": day.get("status")}).lastrowid
+
+        for event in day.get("events", []):
+            event_id = db.session.execute(text(
+                "INSERT INTO dining_event (day_id, eatery_id, date, descr, meal, start_ts, end_ts, start, end) "
+                "VALUES (:day_id, :eatery_id, :date, :descr, :meal, :start_ts, :end_ts, :start, :end)"
+            ), {
+                "day_id": day_id, "eatery_id": eatery_id, "date": date,
+                "descr": event.get("descr"), "meal": normalize_meal(event.get("descr")),
+                "start_ts": event.get("startTimestamp"), "end_ts": event.get("endTimestamp"),
+                "start": event.get("start"), "end": event.get("end"),
+            }).lastrowid
+
+            for category in event.get("menu", []):
+                category_id = db.session.execute(text(
+                    "INSERT INTO dining_category (event_id, eatery_id, name, sort_idx) "
+                    "VALUES (:event_id, :eatery_id, :name, :sort_idx)"
+                ), {
+                    "event_id": event_id, "eatery_id": eatery_id,
+                    "name": category.get("category"), "sort_idx": category.get("sortIdx"),
+                }).lastrowid
+                for entry in category.get("items", []):
+                    if not entry.get("item"):
+                        continue
+                    items.append({
+                        "category_id": category_id, "event_id": event_id, "eatery_id": eatery_id, "date": date,
+                        "name": entry["item"], "name_key": normalize_meal(entry["item"]),
+                        "healthy": bool(entry.get("healthy")), "sort_idx": entry.get("sortIdx"),
+                    })
+    if items:
+        db.session.execute(text(
+            "INSERT INTO dining_item (category_id, event_id, eatery_id, date, name, name_key, healthy, sort_idx) "
+            "VALUES (:category_id, :event_id, :eatery_id, :date, :name, :name_key, :healthy, :sort_idx)"
+        ), items)
+
+
+def find_eatery(db, key):
+    """Eatery row by id, slug or case-insensitive name"""
+    sql = "SELECT id, slug, name, campus_area FROM dining_eatery WHERE "
+    if str(key).isdigit():
+        return db.session.execute(text(sql + "id = :key"), {"key": int(key)}).first()
+    return db.session.execute(
+        text(sql + "slug = :slug OR lower(name) = :name LIMIT 1"),
+        {"slug": eatery_slug({"slug": key}), "name": normalize_meal(key)}
+    ).first()
+
+
+def eatery_menu(db, eatery_id, date, meal=None):
+    """Events served on a date, each with its categories and items, in feed order"""
+    sql = ("SELECT id, descr, start, end, start_ts, end_ts FROM dining_event "
+           "WHERE eatery_id = :eatery_id AND date = :date")
+    params = {"eatery_id": eatery_id, "date": date}
+    if meal:
+        sql += " AND meal = :meal"
+        params["meal"] = normalize_meal(meal)
+    events = db.session.execute(text(sql + " ORDER BY start_ts, id"), params).all()
+    if not events:
+        return []
+
+    event_ids = [event.id for event in events]
+    categories = {}
+    for row in db.session.execute(text(
+        "SELECT c.event_id, c.id AS category_id, c.name AS category, i.name, i.healthy "
+        "FROM dining_category c LEFT JOIN dining_item i ON i.category_id = c.id "
+        "WHERE c.event_id IN :event_ids "
+        "ORDER BY c.sort_idx, c.id, i.sort_idx, i.id"
+    ).bindparams(bindparam("event_ids", expanding=True)), {"event_ids": event_ids}).all():
+        category = categories.setdefault(row.category_id, {"event_id": row.event_id, "category": row.category, "items": []})
+        if row.name is not None:
+            category["items"].append({"item": row.name, "healthy": bool(row.healthy)})
+
+    return [
+        {
+            "meal": event.descr,
+            "start": event.start,
+            "end": event.end,
+            "start_timestamp": event.start_ts,
+            "end_timestamp": event.end_ts,
+            "menu": [
+                {"category": category["category"], "items": category["items"]}
+                for category in categories.values() if category["event_id"] == event.id
+            ],
+        }
+        for event in events
+    ]
+
+
+def where_served(db, name, date=None):
+    """(slug, eatery, date, meal) rows serving an item with exactly this name, case-insensitively"""
+    sql = ("SELECT e.slug, e.name AS eatery, i.date, ev.descr AS meal "
+           "FROM dining_item i JOIN dining_eatery e ON e.id = i.eatery_id JOIN dining_event ev ON ev.id = i.event_id "
+           "WHERE i.name_key = :name_key")
+    params = {"name_key": normalize_meal(name)}
+    if date:
+        sql += " AND i.date = :date"
+        params["date"] = date
+    return db.session.execute(text(sql + " ORDER BY i.date, ev.start_ts, e.name"), params).all()
@@ -5,12 +5,17 @@ from openai import OpenAI
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_dining_menus():
-    url = "https://now.dining.cornell.edu/api/1.0/dining/eateries.json"
-    resp = tapi.get(url)
+DINING_API_URL = os.getenv("DINING_API_URL", "https://now.dining.cornell.edu/api/1.0/dining/eateries.json")
+# (connect, read) seconds; a hung upstream must not hold a worker forever
+FETCH_TIMEOUT = (3.05, 15)
+TOP_MEALS_MODEL = os.getenv("TOP_MEALS_MODEL", "gpt-4o-mini")
+
+def fetch_dining_data(url=DINING_API_URL, timeout=FETCH_TIMEOUT):
+    resp = tapi.get(url, timeout=timeout)
     resp.raise_for_status()
-    data = resp.json()
+    return resp.json()
 
+def parse_dining_menus(data):
     menus = {}
     for eatery in data.get("data", {}).get("eateries", []):
         name = eatery.get("name")
@@ -25,20 +30,38 @@ def get_dining_menus():
         menus[name] = sorted(items)
     return menus
 
-def ask_top_meals(menus, goal="cutting", top_n=10):
-    prompt = (
+def get_dining_menus():
+    return parse_dining_menus(fetch_dining_data())
+
+STREAM_TIMEOUT_SECONDS = 120
+
+def top_meals_prompt(menus, goal, top_n):
+    return (
         f"You are a dietary expert. Given these campus dining hall menus:\n"
         f"{json.dumps(menus, indent=2)}\n\n"
         f"List the top {top_n} meals ideal for {goal}, numbered with a brief justification each."
     )
 
+def ask_top_meals(menus, goal="cutting", top_n=10, model=TOP_MEALS_MODEL, timeout=None):
+    options = {"timeout": timeout} if timeout is not None else {}
     resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        model=model,
+        messages=[{"role": "user", "content": top_meals_prompt(menus, goal, top_n)}],
         temperature=0.7,
+        **options
     )
     return resp.choices[0].message.content
 
+def stream_top_meals(menus, goal="cutting", top_n=10, model=TOP_MEALS_MODEL):
+    """Same completion as ask_top_meals, as an iterable of chunks; close() it to cancel"""
+    return client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": top_meals_prompt(menus, goal, top_n)}],
+        temperature=0.7,
+        stream=True,
+        timeout=STREAM_TIMEOUT_SECONDS,
+    )
+
 if __name__ == "__main__":
     menus = get_dining_menus()
     print(ask_top_meals(menus, goal="cutting", top_n=10))
@@ -0,0 +1,236 @@
+import codecs
+import json
+from datetime import datetime
+from sqlalchemy import bindparam, text
+
+IMPORT_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 50
+# A single array element larger than this is treated as malformed input
+MAX_RECORD_CHARS = 1024 * 1024
+
+REQUIRED_TEXT_FIELDS = ("name", "bodyPart", "equipment", "target")
+LIST_FIELDS = ("secondaryMuscles", "instructions")
+COLUMNS = ("bodyPart", "equipment", "gifUrl", "name", "target", "secondaryMuscles", "instructions")
+
+
+class MalformedRecord:
+    """Stands in for an NDJSON line that is not valid JSON, so the import can skip it"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_text_chunks(stream):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk)
+
+
+def iter_records(stream):
+    """Yield records from a JSON array or NDJSON byte stream without buffering it whole"""
+    chunks = read_text_chunks(stream)
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+
+    if buffer.lstrip().startswith("["):
+        return iter_array(buffer.lstrip()[1:], chunks)
+    return iter_lines(buffer, chunks)
+
+
+def iter_lines(buffer, chunks):
+    while True:
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_line(line)
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield parse_line(buffer)
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return MalformedRecord(f"Invalid JSON: {e}")
+
+
+def iter_array(buffer, chunks):
+    decoder = json.JSONDecoder()
+    exhausted = False
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if exhausted:
+                raise ValueError("Truncated or malformed JSON array")
+            # Without a bound, garbage would be buffered and re-decoded until the stream ends
+            if len(buffer) > MAX_RECORD_CHARS:
+                raise ValueError(f"Malformed JSON array or record over {MAX_RECORD_CHARS} characters")
+            # The next record straddles a chunk boundary; read more
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def validate_record(record):
+    if isinstance(record, MalformedRecord):
+        return None, record.error
+    if not isinstance(record, dict):
+        return None, "Record is not an object"
+
+    for field in REQUIRED_TEXT_FIELDS:
+        if not isinstance(record.get(field), str) or not record.get(field).strip():
+            return None, f"Missing or invalid {field}"
+
+    exercise_id = record.get("id")
+    if exercise_id is not None:
+        try:
+            exercise_id = int(exercise_id)
+        except (TypeError, ValueError):
+            return None, "Invalid id"
+
+    gif_url = record.get("gifUrl") or ""
+    if not isinstance(gif_url, str):
+        return None, "gifUrl must be a string"
+
+    row = {
+        "id": exercise_id,
+        "bodyPart": record["bodyPart"].strip(),
+        "equipment": record["equipment"].strip(),
+        "gifUrl": gif_url,
+        "name": record["name"].strip(),
+        "target": record["target"].strip(),
+    }
+    for field in LIST_FIELDS:
+        values = record.get(field) or []
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            return None, f"{field} must be a list of strings"
+        row[field] = json.dumps(values)
+    return row, None
+
+
+def import_exercises(db, records, batch_size=IMPORT_BATCH_SIZE):
+    """Upsert exercises in batches inside a single transaction.
+
+    Records are matched to existing rows by id, or by name when no id is
+    given. Unchanged rows and invalid records are counted as skipped.
+    """
+    report = {"inserted": 0, "updated": 0, "skipped": 0, "errors": []}
+    batch = []
+    try:
+        for index, record in enumerate(records):
+            row, error = validate_record(record)
+            if error is not None:
+                report["skipped"] += 1
+                if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                    report["errors"].append({"index": index, "error": error})
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                upsert_batch(db, batch, report)
+                batch = []
+        if batch:
+            upsert_batch(db, batch, report)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return report
+
+
+def upsert_batch(db, batch, report):
+    ids = [row["id"] for row in batch if row["id"] is not None]
+    names = [row["name"] for row in batch if row["id"] is None]
+
+    existing = {}
+    if ids:
+        for row in db.session.execute(
+            text(f"SELECT id, {', '.join(COLUMNS)} FROM exercise WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": ids}
+        ).mappings():
+            existing[row["id"]] = dict(row)
+    by_name = {}
+    if names:
+        for row in db.session.execute(
+            text(f"SELECT id, {', '.join(COLUMNS)} FROM exercise WHERE name IN :names").bindparams(bindparam("names", expanding=True)),
+            {"names": names}
+        ).mappings():
+            by_name.setdefault(row["name"], dict(row))
+
+    # Later duplicates within a batch replace earlier ones
+    inserts, updates = {}, {}
+    for row in batch:
+        current = existing.get(row["id"]) if row["id"] is not None else by_name.get(row["name"])
+        if current is None:
+            key = ("id", row["id"]) if row["id"] is not None else ("name", row["name"])
+            if key in inserts:
+                report["skipped"] += 1
+            inserts[key] = row
+            continue
+        row["id"] = current["id"]
+        if row["id"] in updates:
+            # The earlier update of this exercise in the batch is superseded
+            report["skipped"] += 1
+        if all(current[column] == row[column] for column in COLUMNS):
+            report["skipped"] += 1
+            updates.pop(row["id"], None)
+        else:
+            updates[row["id"]] = row
+    inserts = list(inserts.values())
+
+    values = ", ".join(":" + column for column in COLUMNS)
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS)
+
+    with_id = [row for row in inserts if row["id"] is not None] + list(updates.values())
+    if with_id:
+        db.session.execute(text(
+            f"INSERT INTO exercise (id, {', '.join(COLUMNS)}) VALUES (:id, {values}) "
+            f"ON CONFLICT(id) DO UPDATE SET {assignments}"
+        ), with_id)
+
+    without_id = [row for row in inserts if row["id"] is None]
+    if without_id:
+        db.session.execute(text(
+            f"INSERT INTO exercise ({', '.join(COLUMNS)}) VALUES ({values})"
+        ), without_id)
+        # These names had no row before this batch, so the lookup finds the new ids
+        new_ids = dict(db.session.execute(
+            text("SELECT name, MAX(id) FROM exercise WHERE name IN :names GROUP BY name").bindparams(bindparam("names", expanding=True)),
+            {"names": [row["name"] for row in without_id]}
+        ).all())
+        for row in without_id:
+            row["id"] = new_ids[row["name"]]
+
+    changes = [(row["id"], "insert") for row in inserts] + [(row_id, "update") for row_id in updates]
+    if changes:
+        now = datetime.utcnow()
+        db.session.execute(
+            text("INSERT INTO catalog_change (exercise_id, op, created_at) VALUES (:exercise_id, :op, :created_at)"),
+            [{"exercise_id": exercise_id, "op": op, "created_at": now} for exercise_id, op in changes]
+        )
+
+    report["inserted"] += len(inserts)
+    report["updated"] += len(updates)
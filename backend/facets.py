@@ -0,0 +1,79 @@
+import threading
+
+FACET_FIELDS = ("bodyPart", "equipment", "target", "secondaryMuscles")
+
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+
+class FacetIndex:
+    """One bitset (a Python int) per facet value, bit i = i-th indexed exercise"""
+
+    def __init__(self):
+        self.positions = {}
+        self.bitsets = {field: {} for field in FACET_FIELDS}
+        self.all_bits = 0
+        self.lock = threading.Lock()
+
+    def build(self, exercises):
+        with self.lock:
+            self.positions = {}
+            self.bitsets = {field: {} for field in FACET_FIELDS}
+            self.all_bits = 0
+            for exercise in exercises:
+                self._insert(exercise)
+
+    def add(self, exercise):
+        with self.lock:
+            self._insert(exercise)
+
+    def _insert(self, exercise):
+        if exercise["id"] in self.positions:
+            return
+        bit = 1 << len(self.positions)
+        self.positions[exercise["id"]] = len(self.positions)
+        self.all_bits |= bit
+
+        for field in FACET_FIELDS:
+            values = exercise.get(field)
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if value:
+                    bitset = self.bitsets[field]
+                    bitset[value] = bitset.get(value, 0) | bit
+
+    def match(self, field, values):
+        bits = 0
+        for value in values:
+            bits |= self.bitsets[field].get(value, 0)
+        return bits
+
+    def counts(self, filters):
+        """Counts per facet value given {field: [values]} filters.
+
+        Values within a field are OR-ed, fields are AND-ed. A field's own
+        filter is left out when counting that field so pickers can offer
+        alternatives to the current selection. Runs under the lock, since
+        add() grows the per-value dicts in place.
+        """
+        with self.lock:
+            return self._counts(filters)
+
+    def _counts(self, filters):
+        matches = {field: self.match(field, values) for field, values in filters.items() if values}
+
+        total = self.all_bits
+        for bits in matches.values():
+            total &= bits
+
+        facets = {}
+        for field in FACET_FIELDS:
+            mask = self.all_bits
+            for other, bits in matches.items():
+                if other != field:
+                    mask &= bits
+            facets[field] = {value: popcount(bits & mask) for value, bits in self.bitsets[field].items()}
+
+        return {"total": popcount(total), "facets": facets}
@@ -0,0 +1,119 @@
+import os
+import threading
+
+from PIL import Image, ImageSequence
+
+ALLOWED_SIZES = (96, 160, 240, 360)
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def resize_gif(source, target, width, height):
+    """Scale every frame to fit inside width x height, keeping timing and loop count"""
+    with Image.open(source) as image:
+        box = (width or image.width, height or image.height)
+        scale = min(box[0] / image.width, box[1] / image.height, 1.0)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+
+        frames, durations = [], []
+        for frame in ImageSequence.Iterator(image):
+            frames.append(frame.convert("RGBA").resize(size, Image.LANCZOS))
+            durations.append(frame.info.get("duration", image.info.get("duration", 100)))
+
+        frames[0].save(
+            target, "GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=image.info.get("loop", 0),
+            disposal=2,
+            optimize=True
+        )
+
+
+class ResizedGifCache:
+    """Disk cache of resized GIFs, evicted least-recently-used first past a byte budget.
+
+    File mtimes record last use, so the LRU order survives restarts and is
+    shared with other workers using the same directory.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".gif"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        return entries
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def get(self, source, source_hash, gif_id, width, height):
+        """Path of the resized GIF, generating it on first use"""
+        if (width is None and height is None) or any(s is not None and s <= 0 for s in (width, height)):
+            raise ValueError("width and height must be positive, and at least one must be given")
+        key = f"{gif_id}.{source_hash}.{width or 0}x{height or 0}.gif"
+        path = os.path.join(self.directory, key)
+
+        if self._touch(path):
+            return path
+
+        # One generator per variant; everyone else waits for it and then reuses the file
+        key_lock = self._key_lock(key)
+        with key_lock:
+            if self._touch(path):
+                return path
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                resize_gif(source, tmp_path, width, height)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+        with self.lock:
+            self.key_locks.pop(key, None)
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict(keep=key)
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _evict(self, keep):
+        entries = sorted(self._entries())
+        self.total_bytes = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+                self.total_bytes -= size
+            except OSError:
+                pass
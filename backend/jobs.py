@@ -0,0 +1,249 @@
+import json
+import random
+import threading
+import time
+import uuid
+from sqlalchemy import text
+
+from singleflight import lock_owner
+
+JOB_WORKERS = 2
+JOB_TIMEOUT_SECONDS = 60
+JOB_MAX_ATTEMPTS = 3
+JOB_BACKOFF_SECONDS = 2
+JOB_MAX_QUEUED = 100
+JOB_RETENTION_SECONDS = 24 * 3600
+# Workers also poll, to pick up jobs queued by other processes and retries coming due
+POLL_SECONDS = 1.0
+# Expired leases are requeued and old jobs dropped by one thread per process, this often
+RECOVER_SECONDS = 60
+MAX_WAIT_SECONDS = 30
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def serialize_job(row):
+    return {
+        "id": row.id,
+        "kind": row.kind,
+        "status": row.status,
+        "attempts": row.attempts,
+        "result": json.loads(row.result) if row.result is not None else None,
+        "error": row.error,
+        "created_at": row.created_at,
+        "finished_at": row.finished_at,
+    }
+
+
+class JobQueue:
+    """Background jobs persisted in the job table and run by a fixed pool of worker threads.
+
+    The pool size caps how many jobs (LLM calls) run at once in this process,
+    counting attempts that timed out but whose handler has not returned yet.
+    A failed or timed-out attempt is retried with exponential backoff up to
+    max_attempts. Jobs left running by a dead process are picked up again
+    once their lease expires, so restarts do not lose work.
+    """
+
+    def __init__(self, db, context, workers=JOB_WORKERS, timeout=JOB_TIMEOUT_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS, max_queued=JOB_MAX_QUEUED):
+        self.db = db
+        self.context = context
+        self.workers = workers
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self.handlers = {}
+        self.threads = []
+        self.running = 0
+        self.lock = threading.Lock()
+        self.slots = threading.Condition()
+        self.wakeup = threading.Condition()
+        self.finished = threading.Condition()
+
+    def register(self, kind, handler):
+        """handler(payload, timeout) -> JSON-serializable result, run inside an app context"""
+        self.handlers[kind] = handler
+
+    def submit(self, kind, payload, user_id=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        db = self.db
+        queued = db.session.execute(text("SELECT COUNT(*) FROM job WHERE status = 'queued'")).scalar()
+        if queued >= self.max_queued:
+            raise QueueFull("Too many queued jobs, try again later")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        db.session.execute(text(
+            "INSERT INTO job (id, kind, payload, status, attempts, max_attempts, user_id, run_after, created_at) "
+            "VALUES (:id, :kind, :payload, 'queued', 0, :max_attempts, :user_id, :now, :now)"
+        ), {"id": job_id, "kind": kind, "payload": json.dumps(payload), "max_attempts": self.max_attempts,
+            "user_id": user_id, "now": now})
+        db.session.commit()
+        self.start()
+        with self.wakeup:
+            self.wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        return self.db.session.execute(text("SELECT * FROM job WHERE id = :id"), {"id": job_id}).first()
+
+    def wait(self, job_id, seconds):
+        """Job row once finished, or as it stands after waiting up to seconds"""
+        deadline = time.time() + min(seconds, MAX_WAIT_SECONDS)
+        while True:
+            row = self.get(job_id)
+            remaining = deadline - time.time()
+            if row is None or row.status in ("succeeded", "failed") or remaining <= 0:
+                return row
+            # End the read transaction so the next look sees other connections' commits
+            self.db.session.commit()
+            with self.finished:
+                self.finished.wait(min(remaining, POLL_SECONDS))
+
+    def start(self):
+        """Start the worker pool and the recovery thread once per process"""
+        if self.threads:
+            return
+        with self.lock:
+            if self.threads:
+                return
+            self.threads = [
+                threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self.threads.append(threading.Thread(target=self._recover_forever, name="job-recovery", daemon=True))
+            for thread in self.threads:
+                thread.start()
+
+    def _run(self):
+        owner = lock_owner()
+        while True:
+            self._reserve()
+            job = None
+            try:
+                with self.context():
+                    job = self._claim(owner)
+                    if job is not None:
+                        self._execute(job)
+                        continue
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            finally:
+                if job is None:
+                    self._release()
+            with self.wakeup:
+                self.wakeup.wait(POLL_SECONDS)
+
+    def _claim(self, owner):
+        db = self.db
+        now = time.time()
+        candidates = db.session.execute(text(
+            "SELECT id FROM job WHERE status = 'queued' AND run_after <= :now ORDER BY run_after, created_at LIMIT 5"
+        ), {"now": now}).scalars().all()
+        for job_id in candidates:
+            # Conditional update, so only one worker in any process wins the job
+            claimed = db.session.execute(text(
+                "UPDATE job SET status = 'running', attempts = attempts + 1, owner = :owner, "
+                "lease_until = :lease_until, started_at = :now WHERE id = :id AND status = 'queued'"
+            ), {"id": job_id, "owner": owner, "lease_until": now + self.timeout * 2, "now": now}).rowcount
+            db.session.commit()
+            if claimed:
+                return self.get(job_id)
+        return None
+
+    def _reserve(self):
+        """Wait for a free slot; abandoned attempts keep theirs until their handler returns"""
+        with self.slots:
+            while self.running >= self.workers:
+                self.slots.wait()
+            self.running += 1
+
+    def _release(self):
+        with self.slots:
+            self.running -= 1
+            self.slots.notify_all()
+
+    def _execute(self, job):
+        """Run a claimed job; its reserved slot is released once the handler returns"""
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                self._release()
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            result = self._call_with_timeout(handler, job.payload)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self._finish(job.id, "succeeded", result=json.dumps(result))
+
+    def _call_with_timeout(self, handler, payload):
+        """Run the handler on a helper thread; past the timeout the attempt is abandoned"""
+        outcome = {}
+
+        def target():
+            try:
+                with self.context():
+                    outcome["result"] = handler(json.loads(payload), self.timeout)
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                self._release()
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise JobTimeout(f"Job timed out after {self.timeout}s")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _fail(self, job, error):
+        print(f"Job {job.id} attempt {job.attempts} failed: {error}")
+        if job.attempts < job.max_attempts:
+            delay = JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+            self.db.session.execute(text(
+                "UPDATE job SET status = 'queued', run_after = :run_after, error = :error, owner = NULL "
+                "WHERE id = :id AND status = 'running'"
+            ), {"id": job.id, "run_after": time.time() + delay, "error": str(error)})
+            self.db.session.commit()
+            return
+        self._finish(job.id, "failed", error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self.db.session.execute(text(
+            "UPDATE job SET status = :status, result = :result, error = :error, finished_at = :now, owner = NULL "
+            "WHERE id = :id"
+        ), {"id": job_id, "status": status, "result": result, "error": error, "now": time.time()})
+        self.db.session.commit()
+        with self.finished:
+            self.finished.notify_all()
+
+    def _recover_forever(self):
+        while True:
+            try:
+                with self.context():
+                    self.recover()
+            except Exception as e:
+                print(f"Job recovery error: {e}")
+            time.sleep(RECOVER_SECONDS)
+
+    def recover(self):
+        """Requeue jobs whose worker died mid-run and drop old finished jobs"""
+        now = time.time()
+        self.db.session.execute(text(
+            "UPDATE job SET status = 'queued', owner = NULL, run_after = :now "
+            "WHERE status = 'running' AND lease_until < :now"
+        ), {"now": now})
+        self.db.session.execute(text(
+            "DELETE FROM job WHERE status IN ('succeeded', 'failed') AND finished_at < :oldest"
+        ), {"oldest": now - JOB_RETENTION_SECONDS})
+        self.db.session.commit()
@@ -0,0 +1,195 @@
+import re
+import threading
+import numpy as np
+
+SHORTLIST_SIZE = 40
+
+# Keyword groups matched against item and category names
+KEYWORD_FEATURES = {
+    "lean_protein": ("chicken breast", "grilled chicken", "turkey", "tuna", "salmon", "cod", "tilapia", "shrimp",
+                     "fish", "egg white", "tofu", "tempeh", "seitan", "edamame", "lentil", "chickpea", "black bean"),
+    "protein": ("chicken", "beef", "pork", "steak", "egg", "ham", "sausage", "bacon", "lamb", "meatball",
+                "burger", "bean", "greek yogurt", "cottage cheese", "protein"),
+    "vegetable": ("salad", "broccoli", "spinach", "kale", "greens", "vegetable", "veggie", "carrot", "pepper",
+                  "zucchini", "squash", "cauliflower", "asparagus", "green bean", "cabbage", "tomato", "mushroom"),
+    "fruit": ("fruit", "apple", "banana", "berry", "berries", "melon", "orange", "pineapple", "grape"),
+    "whole_grain": ("brown rice", "quinoa", "oatmeal", "oats", "whole wheat", "whole grain", "barley", "farro"),
+    "starch": ("rice", "pasta", "noodle", "potato", "fries", "bread", "bagel", "roll", "tortilla", "pizza",
+               "waffle", "pancake", "french toast", "biscuit", "mac", "couscous"),
+    "fried": ("fried", "fries", "tempura", "crispy", "nugget", "tender", "battered", "breaded", "tots"),
+    "dessert": ("cake", "cookie", "brownie", "pie", "ice cream", "pudding", "donut", "doughnut", "muffin",
+                "pastry", "cupcake", "dessert", "sweet", "chocolate", "syrup", "cinnamon roll"),
+    "creamy": ("cheese", "cream", "alfredo", "butter", "mayo", "ranch", "queso", "gravy", "carbonara"),
+    "grilled": ("grilled", "roasted", "baked", "steamed", "broiled", "poached"),
+    "soup": ("soup", "broth", "chili", "stew"),
+}
+# feature -> (feed field, scale), used when the feed provides nutrition
+NUTRITION_FEATURES = {
+    "calories": ("calories", 800.0),
+    "protein_g": ("protein", 50.0),
+    "fat_g": ("fat", 40.0),
+    "carbs_g": ("carbohydrates", 100.0),
+}
+FEATURES = list(KEYWORD_FEATURES) + ["healthy"] + list(NUTRITION_FEATURES)
+# Whole words only, so "ham" does not match "graham"; plurals allowed
+KEYWORD_PATTERNS = [
+    re.compile(r"\b(?:%s)(?:s|es)?\b" % "|".join(re.escape(word) for word in words))
+    for words in KEYWORD_FEATURES.values()
+]
+
+GOAL_WEIGHTS = {
+    "cutting": {"lean_protein": 3.0, "protein": 1.0, "vegetable": 2.0, "fruit": 1.0, "whole_grain": 0.5,
+                "grilled": 1.0, "soup": 0.5, "healthy": 1.5, "starch": -1.0, "fried": -3.0, "dessert": -3.0,
+                "creamy": -1.5, "calories": -2.0, "protein_g": 2.0, "fat_g": -1.5},
+    "bulking": {"lean_protein": 2.0, "protein": 2.5, "whole_grain": 1.5, "starch": 1.5, "creamy": 0.5,
+                "vegetable": 0.5, "grilled": 0.5, "dessert": -1.0, "fried": -0.5, "calories": 1.5,
+                "protein_g": 2.5, "carbs_g": 1.0},
+    "high protein": {"lean_protein": 3.0, "protein": 2.5, "grilled": 0.5, "vegetable": 0.5, "dessert": -2.0,
+                     "fried": -1.0, "protein_g": 3.0},
+    "maintenance": {"lean_protein": 1.5, "protein": 1.0, "vegetable": 1.5, "fruit": 1.0, "whole_grain": 1.0,
+                    "grilled": 0.5, "healthy": 1.0, "fried": -1.5, "dessert": -1.5, "protein_g": 1.0},
+}
+# Free-text goals are mapped onto the first known one with a matching word or phrase
+GOAL_ALIASES = (
+    # Bulking first, so "lean bulk" is a bulk
+    ("bulking", ("bulk", "bulking", "gain", "gains", "gaining", "mass", "surplus", "weight up",
+                 "high calorie", "high calories")),
+    ("cutting", ("cut", "cuts", "cutting", "lose", "losing", "lost", "loss", "lean", "leaner", "diet",
+                 "dieting", "slim", "slimming", "shred", "shredding", "shredded", "deficit", "fat")),
+    ("high protein", ("protein", "muscle", "muscles", "strength", "recover", "recovery")),
+)
+
+
+def canonical_goal(goal):
+    goal = " ".join(re.findall(r"[a-z]+", (goal or "cutting").lower())) or "cutting"
+    if goal in GOAL_WEIGHTS:
+        return goal
+    # Whole words only, so "fatigue" is not a fat-loss goal and "massage" not a bulk
+    padded = f" {goal} "
+    for canonical, aliases in GOAL_ALIASES:
+        if any(f" {alias} " in padded for alias in aliases):
+            return canonical
+    return "maintenance"
+
+
+def goal_vector(goal):
+    weights = GOAL_WEIGHTS[canonical_goal(goal)]
+    return np.array([weights.get(name, 0.0) for name in FEATURES], dtype=np.float32)
+
+
+def nutrition_value(entry, field):
+    value = entry.get(field)
+    if value is None and isinstance(entry.get("nutrition"), dict):
+        value = entry["nutrition"].get(field)
+    try:
+        return float(re.sub(r"[^0-9.]", "", str(value))) if value is not None else None
+    except ValueError:
+        return None
+
+
+def item_features(name, category, entry):
+    text = f"{name} {category}".lower()
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    for i, pattern in enumerate(KEYWORD_PATTERNS):
+        if pattern.search(text):
+            vector[i] = 1.0
+    vector[len(KEYWORD_FEATURES)] = 1.0 if entry.get("healthy") else 0.0
+    for i, (field, scale) in enumerate(NUTRITION_FEATURES.values(), start=len(KEYWORD_FEATURES) + 1):
+        value = nutrition_value(entry, field)
+        if value is not None:
+            vector[i] = min(value / scale, 2.0)
+    return vector
+
+
+def menu_entries(data):
+    """(eatery, item, category, entry) once per item per eatery, from the raw dining feed"""
+    seen = set()
+    for eatery in data.get("data", {}).get("eateries", []):
+        name = eatery.get("name")
+        for day in eatery.get("operatingHours", []):
+            for event in day.get("events", []):
+                for category in event.get("menu", []):
+                    for entry in category.get("items", []):
+                        item = entry.get("item")
+                        if not item or (name, item) in seen:
+                            continue
+                        seen.add((name, item))
+                        yield name, item, category.get("category") or "", entry
+
+
+class MealRanker:
+    """Scores every menu item for a goal from a precomputed item x feature matrix"""
+
+    def __init__(self):
+        self.content_hash = None
+        # (items, matrix, name_order), swapped as one so a rank never mixes two builds
+        self.state = ([], np.zeros((0, len(FEATURES)), dtype=np.float32), np.zeros(0, dtype=np.int32))
+        self.lock = threading.Lock()
+
+    def ensure(self, snapshot):
+        """Rebuild for a new dining snapshot; a no-op while the menus are unchanged"""
+        if self.content_hash == snapshot.content_hash:
+            return self
+        with self.lock:
+            if self.content_hash != snapshot.content_hash:
+                self.build(snapshot.data, snapshot.content_hash)
+        return self
+
+    def build(self, data, content_hash=None):
+        items, rows = [], []
+        for eatery, item, category, entry in menu_entries(data):
+            items.append({"eatery": eatery, "item": item, "category": category})
+            rows.append(item_features(item, category, entry))
+        matrix = np.vstack(rows) if rows else np.zeros((0, len(FEATURES)), dtype=np.float32)
+        # Ties are broken by name so results are stable between runs
+        name_order = np.empty(len(items), dtype=np.int32)
+        name_order[sorted(range(len(items)), key=lambda row: (items[row]["item"], items[row]["eatery"]))] = \
+            np.arange(len(items), dtype=np.int32)
+        self.state = (items, matrix, name_order)
+        self.content_hash = content_hash
+        return self
+
+    def rank(self, goal, top_n=10, eatery=None, min_score=0.0):
+        """Best items for the goal, scoring above min_score (None keeps everything)"""
+        items, matrix, name_order = self.state
+        if not items:
+            return []
+        weights = goal_vector(goal)
+        scores = matrix @ weights
+        if eatery is not None:
+            mask = np.array([entry["eatery"] == eatery for entry in items])
+            scores = np.where(mask, scores, -np.inf)
+        if min_score is not None:
+            # Nothing that works against the goal (fries and cake when cutting) is recommended
+            scores = np.where(scores > min_score, scores, -np.inf)
+        # A dish served at several eateries is listed once, under its best-scoring one
+        top, seen = [], set()
+        for row in np.lexsort((name_order, -scores)):
+            if len(top) >= top_n or not np.isfinite(scores[row]):
+                break
+            if items[row]["item"] not in seen:
+                seen.add(items[row]["item"])
+                top.append(row)
+
+        results = []
+        for row in top:
+            contributions = matrix[row] * weights
+            reasons = [FEATURES[i] for i in np.argsort(-contributions)[:3] if contributions[i] > 0]
+            results.append(dict(items[row], score=round(float(scores[row]), 3), reasons=reasons))
+        return results
+
+    def shortlist(self, goal, size=SHORTLIST_SIZE):
+        """{eatery: [items]} holding only the best candidates, for a much smaller LLM prompt"""
+        menus = {}
+        # Unfiltered, so a thin menu still leaves the LLM something to choose from
+        for entry in self.rank(goal, top_n=size, min_score=None):
+            menus.setdefault(entry["eatery"], []).append(entry["item"])
+        return {eatery: sorted(items) for eatery, items in sorted(menus.items())}
+
+
+def format_ranking(results):
+    lines = []
+    for i, entry in enumerate(results, start=1):
+        reason = ", ".join(r.replace("_", " ") for r in entry["reasons"]) or "balanced option"
+        lines.append(f"{i}. {entry['item']} ({entry['eatery']}) - {reason}")
+    return "\n".join(lines)
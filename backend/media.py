@@ -0,0 +1,351 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+HASH_LENGTH = 16
+HASH_CHUNK_SIZE = 1024 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+class GifInfo:
+    __slots__ = ("id", "size", "mtime", "hash", "width", "height", "frames")
+
+    def __init__(self, id, size, mtime, hash, width, height, frames):
+        self.id = id
+        self.size = size
+        self.mtime = mtime
+        self.hash = hash
+        self.width = width
+        self.height = height
+        self.frames = frames
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def serialize(self):
+        return {
+            "url": versioned_gif_path(self.id, self.hash),
+            "size": self.size,
+            "width": self.width,
+            "height": self.height,
+            "frames": self.frames,
+        }
+
+
+def gif_dimensions(data):
+    """(width, height, frame count) from the GIF block structure, without decoding pixels"""
+    if len(data) < 13 or data[:6] not in (b"GIF87a", b"GIF89a"):
+        return None, None, 0
+    width = data[6] | (data[7] << 8)
+    height = data[8] | (data[9] << 8)
+
+    position = 13
+    if data[10] & 0x80:
+        position += 3 << ((data[10] & 0x07) + 1)
+
+    frames = 0
+    length = len(data)
+    while position < length:
+        block = data[position]
+        if block == 0x3B:
+            break
+        if block == 0x21:
+            position += 2
+        elif block == 0x2C:
+            frames += 1
+            packed = data[position + 9] if position + 9 < length else 0
+            position += 10
+            if packed & 0x80:
+                position += 3 << ((packed & 0x07) + 1)
+            position += 1
+        else:
+            break
+        # Skip data sub-blocks up to the zero-length terminator
+        while position < length and data[position]:
+            position += data[position] + 1
+        position += 1
+    return width, height, frames
+
+
+class GifManifest:
+    """id -> GifInfo for every GIF, built once so requests never touch the filesystem to find one"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.gifs = {}
+
+    def get(self, gif_id):
+        return self.gifs.get(gif_id)
+
+    def current(self, gif_id):
+        """Like get(), but re-checks size/mtime against the local file so a replaced GIF gets a new hash"""
+        info = self.gifs.get(gif_id)
+        if info is None or not os.path.isdir(self.directory):
+            return info
+        try:
+            stat = os.stat(os.path.join(self.directory, f"{gif_id}.gif"))
+        except OSError:
+            self.gifs.pop(gif_id, None)
+            return None
+        if info.size != stat.st_size or info.mtime != stat.st_mtime:
+            info = self._read(gif_id, stat)
+            self.gifs[gif_id] = info
+        return info
+
+    def _read(self, gif_id, stat):
+        with open(os.path.join(self.directory, f"{gif_id}.gif"), "rb") as f:
+            data = f.read()
+        width, height, frames = gif_dimensions(data)
+        return GifInfo(
+            gif_id, stat.st_size, stat.st_mtime,
+            hashlib.sha256(data).hexdigest()[:HASH_LENGTH],
+            width, height, frames
+        )
+
+    def scan(self):
+        gifs = {}
+        if not os.path.isdir(self.directory):
+            # Object-storage deployments ship without the GIFs; use a prebuilt manifest there
+            self.gifs = gifs
+            return self
+        for name in os.listdir(self.directory):
+            if not name.endswith(".gif") or not name[:-4].isdigit():
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            gif_id = int(name[:-4])
+
+            previous = self.gifs.get(gif_id)
+            if previous is not None and previous.size == stat.st_size and previous.mtime == stat.st_mtime:
+                gifs[gif_id] = previous
+            else:
+                gifs[gif_id] = self._read(gif_id, stat)
+        self.gifs = gifs
+        return self
+
+    def load(self, path):
+        """Read a prebuilt manifest, then rehash or drop any entry the local files no longer match"""
+        with open(path) as f:
+            entries = json.load(f)["gifs"]
+        self.gifs = {int(gif_id): GifInfo(**entry) for gif_id, entry in entries.items()}
+        if os.path.isdir(self.directory):
+            # Unchanged entries are reused as-is, so this costs one stat per GIF
+            self.scan()
+        return self
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"gifs": {str(gif_id): info.to_dict() for gif_id, info in sorted(self.gifs.items())}}, f)
+        os.replace(tmp_path, path)
+
+    def report(self, exercise_ids):
+        exercise_ids = set(exercise_ids)
+        return {
+            "gifs": len(self.gifs),
+            "bytes": sum(info.size for info in self.gifs.values()),
+            "exercises_missing_gif": sorted(exercise_ids - set(self.gifs)),
+            "gifs_without_exercise": sorted(set(self.gifs) - exercise_ids),
+        }
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def versioned_gif_path(gif_id, content_hash):
+    return f"/api/gifs/{gif_id}/{content_hash}.gif"
+
+
+VARIANT_FORMATS = {
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+    "jpg": "image/jpeg",
+}
+MANIFEST_CHECK_SECONDS = 30
+
+
+class VariantManifest:
+    """Read side of the manifest written by transcode.py, reloaded when the file changes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "manifest.json")
+        self.entries = {}
+        self.loaded_mtime = None
+        self.checked_at = 0
+
+    def refresh(self):
+        now = time.time()
+        if now - self.checked_at < MANIFEST_CHECK_SECONDS:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self.entries, self.loaded_mtime = {}, None
+            return
+        if mtime != self.loaded_mtime:
+            with open(self.path) as f:
+                self.entries = json.load(f).get("gifs", {})
+            self.loaded_mtime = mtime
+
+    def variant(self, gif_id, source_hash, fmt):
+        """Variant record for a GIF, or None when missing or built from an older source"""
+        self.refresh()
+        entry = self.entries.get(str(gif_id))
+        if entry is None or entry.get("source_hash") != source_hash:
+            return None
+        return entry.get("variants", {}).get(fmt)
+
+
+def negotiate_gif_format(requested, accept_mimetypes):
+    """Explicit ?format= wins; otherwise WebP only for clients that list it by name"""
+    if requested:
+        return requested
+    if "image/webp" in accept_mimetypes.values() and \
+            accept_mimetypes["image/webp"] >= accept_mimetypes["image/gif"]:
+        return "webp"
+    return "gif"
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def stream_zip(entries, chunk_size=HASH_CHUNK_SIZE // 4):
+    """Yield an uncompressed ZIP of (arcname, path or bytes) entries.
+
+    Files are read and emitted chunk by chunk, so memory stays flat no
+    matter how large the archive gets. GIFs are already compressed, so
+    storing them costs nothing but saves CPU.
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, source in entries:
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            if isinstance(source, bytes):
+                archive.writestr(info, source)
+            else:
+                info.file_size = os.path.getsize(source)
+                with archive.open(info, "w") as dest, open(source, "rb") as src:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dest.write(chunk)
+                        yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+DEFAULT_HOT_CACHE_BYTES = 64 * 1024 * 1024
+# Halve every counter after this many lookups so yesterday's favourites can age out
+FREQUENCY_DECAY_EVERY = 10000
+
+
+class HotGifCache:
+    """Byte-budgeted in-process cache of the most frequently requested GIFs.
+
+    Frequencies are counted for every key, cached or not, and a new GIF
+    only displaces residents that are requested less often than it is.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_HOT_CACHE_BYTES, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 8)
+        self.entries = {}
+        self.frequency = {}
+        self.size = 0
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            self.lookups += 1
+            self.frequency[key] = self.frequency.get(key, 0) + 1
+            if self.lookups % FREQUENCY_DECAY_EVERY == 0:
+                self.frequency = {k: f // 2 for k, f in self.frequency.items() if f > 1 or k in self.entries}
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def offer(self, key, size, load):
+        """Load a missed GIF with load() if it is popular enough to earn a slot"""
+        if size > self.max_entry_bytes:
+            return None
+        with self.lock:
+            # Only a check: nothing is evicted until load() has produced the bytes
+            if key in self.entries or self._victims(key, size) is None:
+                return None
+
+        data = load()
+        if not data:
+            return None
+
+        with self.lock:
+            victims = None if key in self.entries else self._victims(key, len(data))
+            if victims is None:
+                return None
+            for resident in victims:
+                self.size -= len(self.entries.pop(resident))
+                self.evictions += 1
+            self.entries[key] = data
+            self.size += len(data)
+        return data
+
+    def _victims(self, key, size):
+        """Residents to evict so key fits, least frequent first; None when it can't earn the room"""
+        if self.size + size <= self.max_bytes:
+            return []
+
+        frequency = self.frequency.get(key, 0)
+        victims, freed = [], 0
+        for resident in sorted(self.entries, key=lambda k: self.frequency.get(k, 0)):
+            if self.frequency.get(resident, 0) >= frequency:
+                return None
+            victims.append(resident)
+            freed += len(self.entries[resident])
+            if self.size - freed + size <= self.max_bytes:
+                return victims
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
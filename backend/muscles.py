@@ -0,0 +1,85 @@
+import json
+from sqlalchemy import bindparam, text
+
+MUSCLE_ROLES = ("primary", "secondary")
+
+
+def normalize_muscle(name):
+    return " ".join((name or "").lower().split())
+
+
+def exercise_muscle_pairs(target, secondary_muscles):
+    pairs = []
+    if normalize_muscle(target):
+        pairs.append((normalize_muscle(target), "primary"))
+    try:
+        secondary = json.loads(secondary_muscles or "[]")
+    except ValueError:
+        secondary = []
+    for muscle in secondary:
+        if isinstance(muscle, str) and normalize_muscle(muscle):
+            pairs.append((normalize_muscle(muscle), "secondary"))
+    return pairs
+
+
+def sync_exercise_muscles(db, exercise_ids=None):
+    """Rebuild exercise_muscle rows from Exercise.target and Exercise.secondaryMuscles.
+
+    With no ids this backfills the whole catalog. The caller commits.
+    """
+    sql = "SELECT id, target, secondaryMuscles FROM exercise"
+    params = {}
+    if exercise_ids is not None:
+        if not exercise_ids:
+            return 0
+        sql += " WHERE id IN :ids"
+        params["ids"] = list(exercise_ids)
+    statement = text(sql)
+    if exercise_ids is not None:
+        statement = statement.bindparams(bindparam("ids", expanding=True))
+    exercises = db.session.execute(statement, params).all()
+
+    pairs_by_exercise = {row.id: exercise_muscle_pairs(row.target, row.secondaryMuscles) for row in exercises}
+    names = {name for pairs in pairs_by_exercise.values() for name, _ in pairs}
+    if names:
+        db.session.execute(
+            text("INSERT INTO muscle (name) VALUES (:name) ON CONFLICT(name) DO NOTHING"),
+            [{"name": name} for name in sorted(names)]
+        )
+    muscle_ids = dict(db.session.execute(text("SELECT name, id FROM muscle")).all())
+
+    if exercise_ids is None:
+        db.session.execute(text("DELETE FROM exercise_muscle"))
+    else:
+        db.session.execute(
+            text("DELETE FROM exercise_muscle WHERE exercise_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(exercise_ids)}
+        )
+
+    rows = {
+        (exercise_id, muscle_ids[name], role)
+        for exercise_id, pairs in pairs_by_exercise.items()
+        for name, role in pairs
+    }
+    if rows:
+        db.session.execute(
+            text("INSERT INTO exercise_muscle (exercise_id, muscle_id, role) VALUES (:exercise_id, :muscle_id, :role)"),
+            [{"exercise_id": e, "muscle_id": m, "role": r} for e, m, r in sorted(rows)]
+        )
+    return len(rows)
+
+
+def exercises_for_muscle(db, name, role=None):
+    """[(exercise_id, role)] for a muscle, or None when the muscle is unknown"""
+    muscle_id = db.session.execute(
+        text("SELECT id FROM muscle WHERE name = :name"), {"name": normalize_muscle(name)}
+    ).scalar()
+    if muscle_id is None:
+        return None
+
+    sql = "SELECT exercise_id, role FROM exercise_muscle WHERE muscle_id = :muscle_id"
+    params = {"muscle_id": muscle_id}
+    if role is not None:
+        sql += " AND role = :role"
+        params["role"] = role
+    return db.session.execute(text(sql + " ORDER BY role, exercise_id"), params).all()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import time
+from sqlalchemy import text
+
+from singleflight import SingleFlight, run_once
+
+RECOMMENDATION_TTL_SECONDS = 24 * 3600
+RECOMMENDATION_CACHE_BYTES = 8 * 1024 * 1024
+# Generated ahead of time after every menu change
+COMMON_GOALS = ("cutting", "bulking", "maintenance", "high protein")
+
+
+def normalize_goal(goal):
+    return " ".join((goal or "cutting").lower().split())
+
+
+def menus_hash(menus):
+    """Hash of the menus with names trimmed and everything sorted, so equal menus share cache entries"""
+    normalized = {
+        " ".join((name or "").split()): sorted({" ".join(item.split()) for item in items})
+        for name, items in menus.items()
+    }
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def recommendation_key(menu_hash, goal, top_n, model):
+    return hashlib.sha1(f"{menu_hash}|{normalize_goal(goal)}|{top_n}|{model}".encode("utf-8")).hexdigest()
+
+
+def get_recommendation(db, key, ttl=RECOMMENDATION_TTL_SECONDS):
+    """Cached text for a key, or None when missing or older than ttl"""
+    now = time.time()
+    content = db.session.execute(
+        text("SELECT content FROM meal_recommendation WHERE cache_key = :key AND created_at > :oldest"),
+        {"key": key, "oldest": now - ttl}
+    ).scalar()
+    if content is not None:
+        db.session.execute(
+            text("UPDATE meal_recommendation SET last_used_at = :now WHERE cache_key = :key"),
+            {"key": key, "now": now}
+        )
+        db.session.commit()
+    return content
+
+
+def put_recommendation(db, key, menu_hash, goal, top_n, model, content,
+                       ttl=RECOMMENDATION_TTL_SECONDS, max_bytes=RECOMMENDATION_CACHE_BYTES):
+    now = time.time()
+    db.session.execute(
+        text(
+            "INSERT INTO meal_recommendation "
+            "(cache_key, menus_hash, goal, top_n, model, content, size, created_at, last_used_at) "
+            "VALUES (:key, :menus_hash, :goal, :top_n, :model, :content, :size, :now, :now) "
+            "ON CONFLICT(cache_key) DO UPDATE SET content = excluded.content, size = excluded.size, "
+            "created_at = excluded.created_at, last_used_at = excluded.last_used_at"
+        ),
+        {"key": key, "menus_hash": menu_hash, "goal": normalize_goal(goal), "top_n": top_n, "model": model,
+         "content": content, "size": len(content.encode("utf-8")), "now": now}
+    )
+    evict_recommendations(db, ttl, max_bytes)
+    db.session.commit()
+
+
+def evict_recommendations(db, ttl=RECOMMENDATION_TTL_SECONDS, max_bytes=RECOMMENDATION_CACHE_BYTES):
+    """Drop expired entries, then least recently used ones until the cache fits in max_bytes"""
+    db.session.execute(text("DELETE FROM meal_recommendation WHERE created_at <= :oldest"),
+                       {"oldest": time.time() - ttl})
+    rows = db.session.execute(
+        text("SELECT id, size FROM meal_recommendation ORDER BY last_used_at DESC, id DESC")
+    ).all()
+    total, victims = 0, []
+    for row in rows:
+        total += row.size
+        if total > max_bytes:
+            victims.append({"id": row.id})
+    if victims:
+        db.session.execute(text("DELETE FROM meal_recommendation WHERE id = :id"), victims)
+    return len(victims)
+
+
+recommendation_flights = SingleFlight()
+
+
+def cached_recommendation(db, menus, goal, top_n, model, generate, timeout=None):
+    """(text, cached) for the given menus and goal.
+
+    generate() runs at most once per key at a time: other threads share the
+    call, and other processes wait on the flight lock for the cached copy.
+    With timeout set, waiting on someone else's call raises TimeoutError
+    after that many seconds.
+    """
+    menu_hash = menus_hash(menus)
+    key = recommendation_key(menu_hash, goal, top_n, model)
+    content = get_recommendation(db, key)
+    if content is not None:
+        return content, True
+
+    def generate_and_store():
+        content = generate()
+        put_recommendation(db, key, menu_hash, goal, top_n, model, content)
+        return content
+
+    def coordinated():
+        content, shared = run_once(db, f"recommendation:{key}", generate_and_store, lambda: get_recommendation(db, key),
+                                   wait=timeout)
+        return content, shared
+
+    (content, shared_across_processes), shared = recommendation_flights.do(key, coordinated, timeout=timeout)
+    return content, shared or shared_across_processes
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy import text
+
+# type -> (fts table, content table, title column, body column)
+SEARCH_SOURCES = {
+    "exercise": ("exercise_fts", "exercise", "name", "instructions"),
+    "workout": ("workout_fts", "workout", "name", "description"),
+    "post": ("post_fts", "posts", "title", "content"),
+}
+
+# Titles weigh more than bodies in bm25
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def install_search_index(db):
+    with db.engine.begin() as conn:
+        for fts, table, title, body in SEARCH_SOURCES.values():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts}
+            ).first()
+
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{title}, {body}, content='{table}', content_rowid='id', "
+                f"tokenize='porter unicode61')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {title}, {body}) VALUES (new.id, new.{title}, new.{body}); "
+                f"END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {title}, {body}) VALUES ('delete', old.id, old.{title}, old.{body}); "
+                f"END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {title}, {body}) VALUES ('delete', old.id, old.{title}, old.{body}); "
+                f"INSERT INTO {fts}(rowid, {title}, {body}) VALUES (new.id, new.{title}, new.{body}); "
+                f"END"
+            ))
+
+            if exists is None:
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def build_match_query(q):
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return None
+    # Quote every term so user input can't inject FTS syntax; prefix-match the last one
+    return " ".join('"%s"' % term for term in terms) + "*"
+
+
+def search(db, q, types=None, limit=20, offset=0):
+    match = build_match_query(q)
+    if match is None:
+        return []
+
+    selects = []
+    for source_type in types or SEARCH_SOURCES.keys():
+        fts, table, title, body = SEARCH_SOURCES[source_type]
+        selects.append(
+            f"SELECT '{source_type}' AS type, {fts}.rowid AS id, {table}.{title} AS title, "
+            f"snippet({fts}, 1, '<b>', '</b>', '...', 12) AS snippet, "
+            f"bm25({fts}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score "
+            f"FROM {fts} JOIN {table} ON {table}.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match"
+        )
+
+    sql = " UNION ALL ".join(selects) + " ORDER BY score LIMIT :limit OFFSET :offset"
+    rows = db.session.execute(text(sql), {"match": match, "limit": limit, "offset": offset})
+    return [{
+        "type": row.type,
+        "id": row.id,
+        "title": row.title,
+        "snippet": row.snippet,
+        # bm25 is lower-is-better; flip it so clients can sort descending
+        "score": -row.score
+    } for row in rows]
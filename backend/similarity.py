@@ -0,0 +1,204 @@
+import re
+import threading
+import numpy as np
+
+TOP_K = 50
+BLOCK_SIZE = 512
+
+# Relative weight of each feature group in the combined vector
+FEATURE_WEIGHTS = {
+    "target": 2.0,
+    "bodyPart": 1.0,
+    "secondaryMuscles": 1.0,
+    "equipment": 0.5,
+    "instructions": 1.0,
+}
+
+STOPWORDS = {
+    "the", "and", "your", "with", "you", "for", "then", "back", "into", "from",
+    "this", "that", "each", "keep", "hold", "position", "starting", "repeat",
+    "desired", "number", "repetitions", "slowly", "while", "throughout",
+}
+
+
+def instruction_terms(instructions):
+    text = " ".join(instructions or []).lower()
+    return [t for t in re.findall(r"[a-z]+", text) if len(t) > 2 and t not in STOPWORDS]
+
+
+def categorical_features(exercise):
+    features = [
+        ("target", exercise.get("target")),
+        ("bodyPart", exercise.get("bodyPart")),
+        ("equipment", exercise.get("equipment")),
+    ]
+    features += [("secondaryMuscles", m) for m in exercise.get("secondaryMuscles") or []]
+    return [(group, value) for group, value in features if value]
+
+
+class SimilarityModel:
+    def __init__(self, ids, equipment, matrix, vocabulary, features, idf):
+        self.ids = ids
+        self.row_of = {exercise_id: row for row, exercise_id in enumerate(ids)}
+        self.equipment = equipment
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.features = features
+        self.idf = idf
+        self.neighbors = np.zeros((0, 0), dtype=np.int32)
+        self.scores = np.zeros((0, 0), dtype=np.float32)
+
+
+class ExerciseSimilarity:
+    """Cosine similarity over categorical + TF-IDF features with a top-k neighbour table.
+
+    Inserts are folded in incrementally using the existing vocabulary and
+    IDF weights; anything else should go through build().
+    """
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.model = None
+        self.lock = threading.Lock()
+
+    def build(self, exercises):
+        exercises = [e for e in exercises if e.get("id") is not None]
+        terms = [instruction_terms(e.get("instructions")) for e in exercises]
+
+        document_frequency = {}
+        for doc in terms:
+            for term in set(doc):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        # Terms seen once can't make two exercises similar
+        vocabulary = {t: i for i, t in enumerate(sorted(t for t, df in document_frequency.items() if df > 1))}
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        for term, column in vocabulary.items():
+            idf[column] = np.log((1 + len(exercises)) / (1 + document_frequency[term])) + 1
+
+        features = {}
+        for exercise in exercises:
+            for feature in categorical_features(exercise):
+                features.setdefault(feature, len(features))
+
+        model = SimilarityModel(
+            ids=np.array([e["id"] for e in exercises], dtype=np.int64),
+            equipment=np.array([e.get("equipment") or "" for e in exercises], dtype=object),
+            matrix=None,
+            vocabulary=vocabulary,
+            features=features,
+            idf=idf,
+        )
+        model.matrix = np.vstack([self._vectorize(model, e, t) for e, t in zip(exercises, terms)]) \
+            if exercises else np.zeros((0, len(features) + len(vocabulary)), dtype=np.float32)
+        self._compute_neighbors(model)
+
+        with self.lock:
+            self.model = model
+
+    def _vectorize(self, model, exercise, terms=None):
+        categorical = {}
+        for group, value in categorical_features(exercise):
+            column = model.features.get((group, value))
+            if column is not None:
+                categorical.setdefault(group, []).append(column)
+
+        vector = np.zeros(len(model.features) + len(model.vocabulary), dtype=np.float32)
+        for group, columns in categorical.items():
+            # Spread each group's weight over its values so many secondary muscles don't dominate
+            vector[columns] = FEATURE_WEIGHTS[group] / np.sqrt(len(columns))
+
+        tfidf = np.zeros(len(model.vocabulary), dtype=np.float32)
+        for term in terms if terms is not None else instruction_terms(exercise.get("instructions")):
+            column = model.vocabulary.get(term)
+            if column is not None:
+                tfidf[column] += 1
+        tfidf *= model.idf
+        norm = np.linalg.norm(tfidf)
+        if norm > 0:
+            vector[len(model.features):] = tfidf / norm * FEATURE_WEIGHTS["instructions"]
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _compute_neighbors(self, model):
+        count = len(model.ids)
+        k = min(self.top_k, max(count - 1, 0))
+        neighbors = np.zeros((count, k), dtype=np.int32)
+        scores = np.zeros((count, k), dtype=np.float32)
+
+        # Blockwise so memory stays at BLOCK_SIZE x n rather than n x n
+        for start in range(0, count, BLOCK_SIZE):
+            block = model.matrix[start:start + BLOCK_SIZE] @ model.matrix.T
+            rows = np.arange(block.shape[0])
+            block[rows, rows + start] = -np.inf
+            if k == 0:
+                continue
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            neighbors[start:start + BLOCK_SIZE] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + BLOCK_SIZE] = np.take_along_axis(top_scores, order, axis=1)
+
+        model.neighbors = neighbors
+        model.scores = scores
+
+    def add(self, exercise):
+        with self.lock:
+            old = self.model
+            if old is None or exercise.get("id") in old.row_of:
+                return
+
+            vector = self._vectorize(old, exercise)
+            model = SimilarityModel(
+                ids=np.append(old.ids, exercise["id"]),
+                equipment=np.append(old.equipment, exercise.get("equipment") or ""),
+                matrix=np.vstack([old.matrix, vector]),
+                vocabulary=old.vocabulary,
+                features=old.features,
+                idf=old.idf,
+            )
+            new_row = len(old.ids)
+            similarities = old.matrix @ vector
+
+            # Other rows: splice the new exercise in where it beats their current k-th neighbour
+            neighbors, scores = old.neighbors.copy(), old.scores.copy()
+            k = neighbors.shape[1]
+            if k and len(neighbors):
+                for row in np.nonzero(similarities > scores[:, -1])[0]:
+                    position = np.searchsorted(-scores[row], -similarities[row])
+                    neighbors[row] = np.insert(neighbors[row], position, new_row)[:k]
+                    scores[row] = np.insert(scores[row], position, similarities[row])[:k]
+
+            k = min(self.top_k, new_row)
+            order = np.argsort(-similarities)[:k]
+            if neighbors.shape[1] != k:
+                # Table was narrower than top_k because the catalog was tiny; rebuild it
+                model.neighbors, model.scores = None, None
+                self._compute_neighbors(model)
+            else:
+                model.neighbors = np.vstack([neighbors, order.astype(np.int32)])
+                model.scores = np.vstack([scores, similarities[order].astype(np.float32)])
+            self.model = model
+
+    def alternatives(self, exercise_id, equipment=None, limit=10):
+        """[(exercise_id, score)] most similar first, or None when the id is unknown"""
+        model = self.model
+        if model is None or exercise_id not in model.row_of:
+            return None
+        row = model.row_of[exercise_id]
+
+        candidates = model.neighbors[row]
+        scores = model.scores[row]
+        if equipment:
+            keep = np.isin(model.equipment[candidates], list(equipment))
+            candidates, scores = candidates[keep], scores[keep]
+
+            if len(candidates) < limit:
+                # Sparse equipment: score the whole equipment subset directly
+                subset = np.nonzero(np.isin(model.equipment, list(equipment)))[0]
+                subset = subset[subset != row]
+                similarities = model.matrix[subset] @ model.matrix[row]
+                order = np.argsort(-similarities)[:limit]
+                candidates, scores = subset[order], similarities[order]
+
+        return [(int(model.ids[c]), float(s)) for c, s in zip(candidates[:limit], scores[:limit])]
@@ -0,0 +1,109 @@
+import os
+import socket
+import threading
+import time
+from sqlalchemy import text
+
+LOCK_TTL_SECONDS = 180
+POLL_SECONDS = 0.25
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent callers with the same key share one call of fn and its result"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """(result, shared) where shared is True for callers that waited on someone else's call.
+
+        A follower gives up with TimeoutError after timeout seconds; the
+        leader's call carries on.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Shared call {key} did not finish within {timeout}s")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+def lock_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def acquire_lock(db, key, owner, ttl=LOCK_TTL_SECONDS):
+    """Take the named lock unless another owner holds an unexpired one"""
+    now = time.time()
+    db.session.execute(
+        text(
+            "INSERT INTO flight_lock (key, owner, expires_at) VALUES (:key, :owner, :expires_at) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE flight_lock.expires_at < :now OR flight_lock.owner = excluded.owner"
+        ),
+        {"key": key, "owner": owner, "expires_at": now + ttl, "now": now}
+    )
+    db.session.commit()
+    return db.session.execute(
+        text("SELECT owner FROM flight_lock WHERE key = :key"), {"key": key}
+    ).scalar() == owner
+
+
+def release_lock(db, key, owner):
+    db.session.execute(text("DELETE FROM flight_lock WHERE key = :key AND owner = :owner"),
+                       {"key": key, "owner": owner})
+    db.session.commit()
+
+
+def run_once(db, key, compute, lookup, ttl=LOCK_TTL_SECONDS, poll=POLL_SECONDS, wait=None):
+    """(result, shared): compute() in one process at a time, everyone else waits for lookup() to see it.
+
+    compute must store its result where lookup finds it before returning.
+    A waiter whose lock holder died takes over once the lock expires. With
+    wait set, a waiter raises TimeoutError after that many seconds instead.
+    """
+    owner = lock_owner()
+    deadline = time.time() + (wait if wait is not None else ttl)
+    while True:
+        result = lookup()
+        if result is not None:
+            return result, True
+        if acquire_lock(db, key, owner, ttl):
+            try:
+                # Someone may have finished between the lookup and the acquire
+                result = lookup()
+                if result is not None:
+                    return result, True
+                return compute(), False
+            finally:
+                release_lock(db, key, owner)
+        if time.time() > deadline:
+            if wait is not None:
+                raise TimeoutError(f"Lock {key} still held after {wait}s")
+            return compute(), False
+        time.sleep(poll)
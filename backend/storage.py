@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+SIGNED_URL_SECONDS = 24 * 3600
+# Hand out the same signed URL for this long so clients and CDNs can cache it
+SIGNED_URL_REUSE_SECONDS = 12 * 3600
+READ_CHUNK_SIZE = 256 * 1024
+
+
+def gif_object_key(gif_id, content_hash):
+    # Content-hashed keys are immutable, so objects can be cached forever
+    return f"gifs/{gif_id}.{content_hash}.gif"
+
+
+class LocalMediaStorage:
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def local_path(self, gif_id, content_hash):
+        return os.path.join(self.directory, f"{gif_id}.gif")
+
+    def signed_url(self, gif_id, content_hash):
+        return None
+
+    def read(self, gif_id, content_hash):
+        with open(self.local_path(gif_id, content_hash), "rb") as f:
+            return f.read()
+
+    def iter_chunks(self, gif_id, content_hash):
+        with open(self.local_path(gif_id, content_hash), "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                yield chunk
+
+
+class S3MediaStorage:
+    """GIFs in an S3-compatible bucket (AWS, MinIO, moto, ...), addressed by content hash"""
+
+    name = "s3"
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_base_url=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("MEDIA_STORAGE=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.signed_urls = {}
+        self.lock = threading.Lock()
+
+    def local_path(self, gif_id, content_hash):
+        return None
+
+    def signed_url(self, gif_id, content_hash):
+        key = gif_object_key(gif_id, content_hash)
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+
+        now = time.time()
+        with self.lock:
+            cached = self.signed_urls.get(key)
+            if cached is not None and now - cached[0] < SIGNED_URL_REUSE_SECONDS:
+                return cached[1]
+
+        url = self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=SIGNED_URL_SECONDS
+        )
+        with self.lock:
+            self.signed_urls[key] = (now, url)
+        return url
+
+    def read(self, gif_id, content_hash):
+        response = self.client.get_object(Bucket=self.bucket, Key=gif_object_key(gif_id, content_hash))
+        return response["Body"].read()
+
+    def iter_chunks(self, gif_id, content_hash):
+        response = self.client.get_object(Bucket=self.bucket, Key=gif_object_key(gif_id, content_hash))
+        body = response["Body"]
+        try:
+            for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    def upload(self, path, gif_id, content_hash):
+        """Upload one GIF unless an object with the same content hash is already there"""
+        key = gif_object_key(gif_id, content_hash)
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return False
+        except self.client.exceptions.ClientError:
+            pass
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={
+            "ContentType": "image/gif",
+            "CacheControl": "public, max-age=31536000, immutable",
+        })
+        return True
+
+
+def media_storage_from_env(gif_directory):
+    backend = os.environ.get("MEDIA_STORAGE", "local")
+    if backend == "local":
+        return LocalMediaStorage(gif_directory)
+    if backend == "s3":
+        return S3MediaStorage(
+            bucket=os.environ["MEDIA_BUCKET"],
+            endpoint_url=os.environ.get("MEDIA_ENDPOINT_URL"),
+            region=os.environ.get("MEDIA_REGION"),
+            public_base_url=os.environ.get("MEDIA_PUBLIC_BASE_URL"),
+        )
+    raise RuntimeError(f"Unknown MEDIA_STORAGE backend: {backend}")
@@ -0,0 +1,71 @@
+import json
+import queue
+import threading
+
+FIRST_TOKEN_SECONDS = 10
+IDLE_SECONDS = 30
+
+
+class StreamTimeout(Exception):
+    pass
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def iter_completion_deltas(open_stream, first_token_seconds=FIRST_TOKEN_SECONDS, idle_seconds=IDLE_SECONDS):
+    """Yield text deltas of a streamed chat completion, read on a helper thread.
+
+    Raises StreamTimeout when the first token takes longer than
+    first_token_seconds or the stream then goes quiet for idle_seconds.
+    Closing the generator (e.g. when the client disconnects) closes the
+    upstream stream so the completion stops being generated and billed.
+    """
+    deltas = queue.Queue()
+    cancelled = threading.Event()
+    upstream = {}
+
+    def produce():
+        try:
+            stream = open_stream()
+            upstream["stream"] = stream
+            if cancelled.is_set():
+                stream.close()
+                return
+            for chunk in stream:
+                if cancelled.is_set():
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    deltas.put(("delta", delta))
+            deltas.put(("done", None))
+        except Exception as e:
+            deltas.put(("error", e))
+
+    threading.Thread(target=produce, name="completion-stream", daemon=True).start()
+
+    started = False
+    try:
+        while True:
+            try:
+                kind, value = deltas.get(timeout=idle_seconds if started else first_token_seconds)
+            except queue.Empty:
+                if not started:
+                    raise StreamTimeout(f"No response within {first_token_seconds}s")
+                raise StreamTimeout(f"Response stalled for {idle_seconds}s")
+            if kind == "delta":
+                started = True
+                yield value
+            elif kind == "done":
+                return
+            else:
+                raise value
+    finally:
+        cancelled.set()
+        stream = upstream.get("stream")
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
@@ -0,0 +1,181 @@
+"""Build WebP, MP4 and JPEG poster variants for every exercise GIF.
+
+    python transcode.py [--jobs N] [--force]
+
+Only GIFs whose content hash changed since the last run are reprocessed.
+MP4 output needs an ffmpeg binary on PATH (or FFMPEG_BINARY); without it
+the other variants are still produced.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+from PIL import Image, ImageSequence
+
+from media import VARIANT_FORMATS, file_hash
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GIF_DIRECTORY = os.path.join(BASE_DIR, "exercise_gifs")
+VARIANT_DIRECTORY = os.path.join(BASE_DIR, "gif_variants")
+MANIFEST_PATH = os.path.join(VARIANT_DIRECTORY, "manifest.json")
+
+WEBP_QUALITY = 75
+POSTER_QUALITY = 80
+MP4_CRF = 28
+MANIFEST_SAVE_EVERY = 50
+
+
+def find_ffmpeg():
+    return os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"gifs": {}}
+
+
+def save_manifest(manifest):
+    manifest["generated_at"] = int(time.time())
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def write_webp(source, target):
+    with Image.open(source) as image:
+        frames = [frame.convert("RGBA") for frame in ImageSequence.Iterator(image)]
+        durations = [frame.info.get("duration", image.info.get("duration", 100)) for frame in ImageSequence.Iterator(image)]
+        frames[0].save(
+            target, "WEBP",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=image.info.get("loop", 0),
+            quality=WEBP_QUALITY,
+            method=4
+        )
+
+
+def write_poster(source, target):
+    with Image.open(source) as image:
+        image.seek(0)
+        image.convert("RGB").save(target, "JPEG", quality=POSTER_QUALITY, optimize=True, progressive=True)
+
+
+def write_mp4(ffmpeg, source, target):
+    subprocess.run([
+        ffmpeg, "-y", "-loglevel", "error", "-i", source,
+        "-movflags", "+faststart",
+        "-pix_fmt", "yuv420p",
+        # yuv420p needs even dimensions
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-c:v", "libx264", "-crf", str(MP4_CRF), "-an",
+        target
+    ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def transcode_one(job):
+    """Runs in a worker process; returns (gif_id, manifest entry or None, error or None)"""
+    gif_id, source_hash, ffmpeg = job
+    source = os.path.join(GIF_DIRECTORY, f"{gif_id}.gif")
+    writers = {
+        "webp": write_webp,
+        "jpg": write_poster,
+    }
+    if ffmpeg:
+        writers["mp4"] = lambda src, dst: write_mp4(ffmpeg, src, dst)
+
+    variants = {}
+    tmp_target = None
+    try:
+        for fmt, writer in writers.items():
+            filename = f"{gif_id}.{source_hash}.{fmt}"
+            target = os.path.join(VARIANT_DIRECTORY, filename)
+            tmp_target = f"{target}.{os.getpid()}.tmp.{fmt}"
+            writer(source, tmp_target)
+            os.replace(tmp_target, target)
+            variants[fmt] = {
+                "path": filename,
+                "size": os.path.getsize(target),
+                "mimetype": VARIANT_FORMATS[fmt],
+                "hash": file_hash(target),
+            }
+    except Exception as e:
+        # One unreadable GIF (Pillow raises ValueError, EOFError, ...) must not abort the batch
+        if tmp_target is not None:
+            try:
+                os.remove(tmp_target)
+            except OSError:
+                pass
+        return gif_id, None, f"{type(e).__name__}: {e}"
+    return gif_id, {"source_hash": source_hash, "variants": variants}, None
+
+
+def remove_stale_files(gif_id, entry):
+    for variant in (entry or {}).get("variants", {}).values():
+        try:
+            os.remove(os.path.join(VARIANT_DIRECTORY, variant["path"]))
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcode exercise GIFs into lighter variants")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="reprocess every GIF")
+    args = parser.parse_args(argv)
+
+    os.makedirs(VARIANT_DIRECTORY, exist_ok=True)
+    manifest = load_manifest()
+    entries = manifest.setdefault("gifs", {})
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        print("ffmpeg not found, skipping MP4 variants", file=sys.stderr)
+    wanted = {"webp", "jpg"} | ({"mp4"} if ffmpeg else set())
+
+    sources = {name[:-4] for name in os.listdir(GIF_DIRECTORY) if name.endswith(".gif") and name[:-4].isdigit()}
+    jobs = []
+    for gif_id in sorted(sources, key=int):
+        source_hash = file_hash(os.path.join(GIF_DIRECTORY, f"{gif_id}.gif"))
+        entry = entries.get(gif_id)
+        if not args.force and entry and entry.get("source_hash") == source_hash and \
+                wanted <= set(entry.get("variants", {})):
+            continue
+        jobs.append((gif_id, source_hash, ffmpeg))
+
+    for gif_id in set(entries) - sources:
+        remove_stale_files(gif_id, entries.pop(gif_id))
+
+    print(f"{len(sources)} GIFs, {len(jobs)} to transcode with {args.jobs} workers")
+    started, done, skipped = time.time(), 0, 0
+    with Pool(processes=max(1, args.jobs)) as pool:
+        for gif_id, entry, error in pool.imap_unordered(transcode_one, jobs):
+            if error is not None:
+                skipped += 1
+                print(f"  skipped {gif_id}: {error}", file=sys.stderr)
+                continue
+            old = entries.get(gif_id)
+            if old and old.get("source_hash") != entry["source_hash"]:
+                remove_stale_files(gif_id, old)
+            entries[gif_id] = entry
+            done += 1
+            if done % MANIFEST_SAVE_EVERY == 0:
+                save_manifest(manifest)
+                print(f"  {done}/{len(jobs)}")
+
+    save_manifest(manifest)
+    print(f"Transcoded {done} GIFs ({skipped} skipped) in {time.time() - started:.1f}s")
+    return 1 if skipped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())